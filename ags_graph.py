@@ -0,0 +1,141 @@
+import itertools
+
+from main import CorequisiteBundle, Schedule, bundle_corequisites, in_pool_order
+
+"""
+GRAPH
+"""
+
+
+class Graph:
+    """Graph ADT, with adjacency stored as one int bitset per vertex.
+
+    Vertices are numbered in the order they are added, and find_vertex() is a dict lookup,
+    so adding every edge of n vertices takes O(n²) time instead of O(n³).
+    """
+
+    def __init__(self):
+        self.vertices = []  # vertex number → value
+        self.index = dict()  # value → vertex number
+        self.adjacency = []  # vertex number → bitset with bit j set if there's an edge to vertex j
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def add_vertex(self, value):
+        self.index[value] = len(self.vertices)
+        self.vertices.append(value)
+        self.adjacency.append(0)
+
+    def find_vertex(self, value):
+        """Returns the vertex number of a value, or None."""
+        return self.index.get(value)
+
+    def add_edge(self, value1, value2):
+        """Add an undirected edge between two values' vertices."""
+        v1, v2 = self.index[value1], self.index[value2]
+        self.adjacency[v1] |= 1 << v2
+        self.adjacency[v2] |= 1 << v1
+
+    def remove_edge(self, value1, value2):
+        v1, v2 = self.index[value1], self.index[value2]
+        self.adjacency[v1] &= ~(1 << v2)
+        self.adjacency[v2] &= ~(1 << v1)
+
+    def get_adj_vertices(self, value):
+        """Returns the values adjacent to a value."""
+        bits = self.adjacency[self.index[value]]
+        return [vertex for i, vertex in enumerate(self.vertices) if bits >> i & 1]
+
+
+"""
+GRAPH IMPLEMENTATION OF AGS
+"""
+
+
+def vertex_label(course):
+    """A vertex's CRN, or its CRNs for a bundle, e.g. '<50537>' or '<50120> + <50175>'."""
+    return repr(course) if isinstance(course, CorequisiteBundle) else f'<{course.crn}>'
+
+
+class AGSGraph:
+    """The graph alternative to AGS. Every course (or corequisite bundle) is a vertex, and two vertices
+    of different groups share an edge when they don't conflict, so the graph is k-partite with one part
+    per group, and every valid schedule is a clique with exactly one vertex in each part.
+
+    The search keeps the set of candidates adjacent to every vertex chosen so far, and always branches on
+    the part with the fewest candidates left, so a part that runs out ends the branch right away.
+    """
+
+    def __init__(self, supplied_courses):
+        self.supplied_courses = supplied_courses  # list of Course and Elective objects
+        self.graph = Graph()
+        self.schedules = []
+        self.num_recursions = 0
+        for course in bundle_corequisites(supplied_courses):
+            self.graph.add_vertex(course)
+        self.parts = dict()  # group → bitset of its vertices, e.g. {'CSCI 205': 0b110}
+        for i, course in enumerate(self.graph.vertices):
+            self.parts[course.group] = self.parts.get(course.group, 0) | 1 << i
+        for course1, course2 in itertools.combinations(self.graph.vertices, 2):
+            if course1.group != course2.group and not course1.is_conflicting_with(course2) and \
+                    in_pool_order(course1, course2):
+                self.graph.add_edge(course1, course2)
+
+    def __repr__(self):
+        """Each vertex's adjacent vertices, e.g. '<50537> → <50536>, <52638>'."""
+        lines = ["Course | Compatibles"]
+        for course in self.graph.vertices:
+            adjacent = ', '.join(vertex_label(other) for other in self.graph.get_adj_vertices(course))
+            lines.append(f"{vertex_label(course)} → {adjacent}")
+        return '\n'.join(lines)
+
+    def print_schedules(self):
+        for i, schedule in enumerate(self.schedules):
+            print(f"\nSchedule #{i + 1}:\n{schedule}", end="")
+        print("\n")
+
+    def build_schedules(self):
+        self.schedules.extend(self.iter_schedules())
+
+    def iter_schedules(self, limit=None):
+        """Lazily yield every schedule, with corequisite bundles replaced by the courses in them."""
+        return itertools.islice(self.find_cliques(0, (1 << len(self.graph)) - 1, list(self.parts.values())), limit)
+
+    def find_cliques(self, clique, candidates, parts):
+        """Yield a schedule for every clique that extends clique (a bitset of vertices) with one of the
+        candidates from each of parts (bitsets of the groups not in the clique yet)."""
+        self.num_recursions += 1
+        if not parts:
+            courses = []
+            while clique:
+                lowest_bit = clique & -clique
+                clique ^= lowest_bit
+                course = self.graph.vertices[lowest_bit.bit_length() - 1]
+                courses.extend(course.courses if isinstance(course, CorequisiteBundle) else [course])
+            yield Schedule(courses)
+            return
+        part = min(parts, key=lambda bits: bin(bits & candidates).count('1'))  # fewest choices first
+        other_parts = [bits for bits in parts if bits != part]
+        choices = part & candidates
+        while choices:
+            lowest_bit = choices & -choices
+            choices ^= lowest_bit
+            next_candidates = candidates & self.graph.adjacency[lowest_bit.bit_length() - 1]
+            if all(next_candidates & bits for bits in other_parts):  # every other part still has a choice
+                yield from self.find_cliques(clique | lowest_bit, next_candidates, other_parts)
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    from catalog import load_catalog
+
+    ags_graph = AGSGraph(load_catalog().get_sections('CSCI 205', 'CSCI 206', 'CSCI 206L', 'MATH 201'))
+    print(ags_graph)
+    ags_graph.build_schedules()
+    ags_graph.print_schedules()
+    print(f"find_cliques() was called {ags_graph.num_recursions} times.")
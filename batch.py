@@ -0,0 +1,121 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import load_catalog
+from main import AGS
+
+"""
+SHARED CATALOG
+"""
+
+
+class SharedCatalog:
+    """A catalog whose sections are all materialized once, with their occupancy masks, and then shared by
+    every request solved in the same process.
+
+    Each request still checks its own pairs of sections in AGS.prepare(): a pair is a single AND of two
+    masks, which measured no slower than looking the pair up in catalog-wide conflict rows.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.courses = catalog.courses  # builds every Course now, instead of once per request that needs it
+
+    def get_courses(self, request):
+        """Given a request, get its courses: every section of request['courses'], e.g. ['CSCI 205', 'MATH 201'],
+        plus each list of request['electives'] as one elective pool, e.g. [['PHIL 100', 'PSYC 100']]."""
+        courses = self.catalog.get_sections(*request.get('courses', []))
+        for elective_num, names in enumerate(request.get('electives', []), 1):
+            courses += self.catalog.get_electives(elective_num, *names)
+        return courses
+
+    def solve(self, request, cancel=None):
+        """Returns the schedules for a request as tuples of CRNs, at most request['limit'] of them if given.
+        The search raises SearchCancelled as soon as the optional cancel token (see AGS.cancel) is set."""
+        ags = AGS(self.get_courses(request))
+        ags.cancel = cancel
+        return [tuple(course.crn for course in schedule.courses)
+                for schedule in ags.iter_schedules(request.get('limit'))]
+
+
+"""
+BATCH SCHEDULING
+"""
+
+worker_catalog = None  # each worker process's own SharedCatalog, built once by start_batch_worker()
+
+
+def start_batch_worker(path):
+    global worker_catalog
+    worker_catalog = SharedCatalog(load_catalog(path))  # the compiled cache is mapped, not parsed again
+
+
+def solve_in_worker(request):
+    return worker_catalog.solve(request)
+
+
+def request_key(request):
+    """Given a request, get a key that is the same for requests with the same courses and pools in any order."""
+    return (tuple(sorted(request.get('courses', []))),
+            tuple(sorted(tuple(sorted(names)) for names in request.get('electives', []))), request.get('limit'))
+
+
+def run_batch(requests, path='course_data.json', workers=None, stats=None):
+    """Yield (request index, schedules as tuples of CRNs) for every request as soon as it is solved, in the
+    order each unique request first appears, with its duplicates right after it. Identical requests are solved
+    once, by a pool of worker processes (or in this process if workers is 0), each with its own SharedCatalog.
+
+    If a stats dict is given, it is kept up to date with the requests, unique requests, and schedules
+    done so far, the seconds taken, and the requests and schedules per second.
+    """
+    stats = stats if stats is not None else dict()
+    start = time.perf_counter()
+    unique = dict()  # request_key() → indices of the requests with that key
+    for index, request in enumerate(requests):
+        unique.setdefault(request_key(request), []).append(index)
+    stats.update(requests=0, unique_requests=len(unique), schedules=0)
+    unique_requests = [requests[indices[0]] for indices in unique.values()]
+
+    if workers == 0:
+        shared = SharedCatalog(load_catalog(path))
+        results = map(shared.solve, unique_requests)
+        executor = None
+    else:
+        workers = workers or os.cpu_count()
+        executor = ProcessPoolExecutor(workers, initializer=start_batch_worker, initargs=(path,))
+        chunksize = max(1, len(unique_requests) // (workers * 8))  # fewer round trips, but still streamed
+        results = executor.map(solve_in_worker, unique_requests, chunksize=chunksize)
+    try:
+        for indices, schedules in zip(unique.values(), results):
+            for index in indices:
+                stats['requests'] += 1
+                stats['schedules'] += len(schedules)
+                stats['seconds'] = time.perf_counter() - start
+                stats['requests_per_second'] = stats['requests'] / stats['seconds']
+                stats['schedules_per_second'] = stats['schedules'] / stats['seconds']
+                yield index, schedules
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    generator = random.Random(205)
+    popular = [['CSCI 205', 'CSCI 206', 'MATH 201'], ['PHYS 211', 'PHYS 211L', 'CSCI 203', 'CSCI 203L'],
+               ['ECON 101', 'PHIL 100', 'CHEM 205', 'CHEM 205L', 'CHEM 205R']]
+    pool = ['PSYC 100', 'POLS 170', 'EDUC 102', 'WMST 150', 'ENLS 101']
+    batch_requests = [{'courses': generator.choice(popular), 'electives': [generator.sample(pool, 2)], 'limit': 100}
+                      for _ in range(1000)]
+    batch_stats = dict()
+    for _ in run_batch(batch_requests, workers=2, stats=batch_stats):
+        pass
+    print(f"{batch_stats['requests']} requests ({batch_stats['unique_requests']} unique) and "
+          f"{batch_stats['schedules']} schedules in {batch_stats['seconds']:.2f} s: "
+          f"{batch_stats['requests_per_second']:.0f} requests/s.")
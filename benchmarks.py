@@ -0,0 +1,233 @@
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from ags_graph import AGSGraph
+from catalog import load_catalog
+from main import AGS, Course, format_minutes
+
+"""
+WORKLOADS
+"""
+
+# required courses for each catalog workload, one list per search group (corequisites are bundled into one group),
+# chosen so that every prefix of them still has schedules, and none of them are in ELECTIVE_POOL
+CATALOG_GROUPS = [['MATH 201'], ['PHYS 211', 'PHYS 211L', 'PHYS 211P'], ['CSCI 203', 'CSCI 203L'],
+                  ['CHIN 101', 'CHIN 101R'], ['EDUC 101'], ['ITAL 101', 'ITAL 101R'], ['SLIF 001'], ['FOUN 098'],
+                  ['MGMT 100', 'MGMT 100R'], ['UNIV 175'], ['MUSC 260'], ['SOCI 100']]
+ELECTIVE_POOL = ['PHIL 100', 'PSYC 100', 'POLS 170', 'POLS 140', 'EDUC 102', 'WMST 150', 'ECON 101', 'ENLS 101']
+
+
+def catalog_workload(catalog, num_groups, num_electives=0):
+    """The first num_groups - num_electives groups of CATALOG_GROUPS, plus num_electives pools of ELECTIVE_POOL,
+    so the search has exactly num_groups groups."""
+    courses = catalog.get_sections(*[name for group in CATALOG_GROUPS[:num_groups - num_electives] for name in group])
+    for elective_num in range(1, num_electives + 1):
+        courses += catalog.get_electives(elective_num, *ELECTIVE_POOL)
+    return courses
+
+
+def synthetic_course(group, section, start, length, days):
+    """A made-up section of course 'SYN <group>' meeting for length minutes from start."""
+    return Course('SYN', str(group), f'{section:02}', format_minutes(start), format_minutes(start + length), days,
+                  f'9{group:02}{section:02}')
+
+
+def no_conflicts_workload(num_groups=6, num_sections=6):
+    """Every section has its own time, so every combination is valid: the largest possible output."""
+    return [synthetic_course(group, section, 8 * 60 + 10 * (group * num_sections + section), 5, 'MTWRF')
+            for group in range(num_groups) for section in range(num_sections)]
+
+
+def pigeonhole_workload(num_sections=8):
+    """num_sections + 1 groups competing for num_sections time slots: no valid schedule exists, but every
+    pair of groups is compatible, so nothing is ruled out until the last groups of a branch."""
+    return [synthetic_course(group, section, 8 * 60 + 60 * section, 50, 'MWF')
+            for group in range(num_sections + 1) for section in range(num_sections)]
+
+
+def random_workload(num_groups=8, num_sections=6, seed=205):
+    """Randomly placed sections, reproducible through seed."""
+    generator = random.Random(seed)
+    courses = []
+    for group in range(num_groups):
+        for section in range(num_sections):
+            days = generator.choice(['MWF', 'TR', 'MW', 'WF', 'T', 'R'])
+            courses.append(synthetic_course(group, section, generator.randrange(8 * 6, 20 * 6) * 10,
+                                            generator.choice([50, 80, 110]), days))
+    return courses
+
+
+def get_workloads(catalog):
+    """Returns workload name → list of courses, in a fixed order."""
+    workloads = dict()
+    for num_groups in (4, 6, 8, 12):
+        workloads[f'catalog-{num_groups}'] = catalog_workload(catalog, num_groups)
+        workloads[f'catalog-{num_groups}-electives'] = catalog_workload(catalog, num_groups, 1)
+    workloads['synthetic-no-conflicts'] = no_conflicts_workload()
+    workloads['synthetic-pigeonhole'] = pigeonhole_workload()
+    workloads['synthetic-random'] = random_workload()
+    return workloads
+
+
+def request_shape(courses):
+    """Returns what the engines' speed depends on for a list of courses, e.g. {'sections': 25, 'groups': 4,
+    'pools': 1}: groups are counted after corequisites are bundled, i.e. what is searched."""
+    return {'sections': len(courses), 'groups': len(AGS(courses).get_path()),
+            'pools': len({course.pool for course in courses if course.pool is not None})}
+
+
+"""
+ENGINES
+"""
+
+
+def run_ags(courses):
+    """Count every valid schedule with AGS, returning (number of schedules, nodes visited)."""
+    ags = AGS(courses)
+    num_schedules = sum(1 for _ in ags.iter_schedules())
+    return num_schedules, ags.num_recursions
+
+
+def run_graph(courses):
+    """Count every valid schedule with AGSGraph, returning (number of schedules, nodes visited)."""
+    ags_graph = AGSGraph(courses)
+    num_schedules = sum(1 for _ in ags_graph.iter_schedules())
+    return num_schedules, ags_graph.num_recursions
+
+
+ENGINES = {
+    'ags': run_ags,
+    'graph': run_graph,
+}
+
+
+"""
+BENCHMARKING
+"""
+
+
+def measure(engine, courses, repeat):
+    """Run an engine on a workload and return its timings, peak memory, and search statistics."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        num_schedules, num_nodes = engine(courses)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()  # a separate run, since tracing slows everything down
+    engine(courses)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best_time = min(times)
+    return {
+        **request_shape(courses),
+        'schedules': num_schedules,
+        'nodes': num_nodes,
+        'best_seconds': best_time,
+        'median_seconds': sorted(times)[len(times) // 2],
+        'peak_memory_bytes': peak_memory,
+        'schedules_per_second': num_schedules / best_time if best_time else None,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(workload_names=None, engine_names=None, repeat=3):
+    """Returns a report with one result per (workload, engine) pair."""
+    workloads = get_workloads(load_catalog())
+    results = []
+    for workload_name, courses in workloads.items():
+        if workload_names and workload_name not in workload_names:
+            continue
+        for engine_name, engine in ENGINES.items():
+            if engine_names and engine_name not in engine_names:
+                continue
+            result = {'workload': workload_name, 'engine': engine_name}
+            result.update(measure(engine, courses, repeat))
+            results.append(result)
+            print(f"{workload_name:<28} {engine_name:<8} {result['best_seconds'] * 1000:10.2f} ms "
+                  f"{result['nodes']:>9} nodes {result['schedules']:>8} schedules "
+                  f"{result['peak_memory_bytes'] / 1024:10.1f} KiB")
+    fastest = fastest_engines(results)
+    for workload_name, engine_name in fastest.items():
+        print(f"{workload_name:<28} fastest: {engine_name}")
+    return {
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'results': results,
+        'fastest': fastest,
+    }
+
+
+def fastest_engines(results):
+    """Returns workload name → the engine with the best time on it, i.e. the engine to use for that shape
+    of request."""
+    best = dict()
+    for result in results:
+        workload_name = result['workload']
+        if workload_name not in best or result['best_seconds'] < best[workload_name]['best_seconds']:
+            best[workload_name] = result
+    return {workload_name: result['engine'] for workload_name, result in best.items()}
+
+
+def select_engine(report, courses):
+    """Returns the engine to use for a request: the fastest one on the report's workload whose
+    request_shape() is closest to the request's, comparing each feature on a log scale."""
+    shape = request_shape(courses)
+
+    def distance(result):
+        return sum(abs(math.log1p(result.get(feature, 0)) - math.log1p(value)) for feature, value in shape.items())
+
+    closest = min(report['results'], key=distance)
+    return report['fastest'][closest['workload']]
+
+
+def compare_reports(baseline, report):
+    """Print how each result's best time changed relative to a baseline report."""
+    baseline_times = {(result['workload'], result['engine']): result['best_seconds']
+                      for result in baseline['results']}
+    print(f"Compared with {baseline.get('commit')}:")
+    for result in report['results']:
+        before = baseline_times.get((result['workload'], result['engine']))
+        if before:
+            print(f"{result['workload']:<28} {result['engine']:<8} {result['best_seconds'] / before:6.2f}x")
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the scheduling engines on fixed workloads.')
+    parser.add_argument('--workload', action='append', help='only run this workload (repeatable)')
+    parser.add_argument('--engine', action='append', help='only run this engine (repeatable)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per workload (the best is reported)')
+    parser.add_argument('--output', default='bench_output.json', help='where to save the JSON report')
+    parser.add_argument('--compare', help='a previously saved JSON report to compare against')
+    parser.add_argument('--select', nargs='+', metavar='COURSE', help='also print the engine to use for a request '
+                                                                     "of these courses, e.g. 'MATH 201' 'ECON 101'")
+    args = parser.parse_args()
+
+    benchmark_report = run_benchmarks(args.workload, args.engine, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(benchmark_report, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare_reports(json.load(file), benchmark_report)
+    if args.select:
+        print(f"Engine for {', '.join(args.select)}: "
+              f"{select_engine(benchmark_report, load_catalog().get_sections(*args.select))}")
@@ -0,0 +1,258 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from main import DAYS, Course, Elective, calc_minutes, choose_electives, convert_24, format_minutes
+
+"""
+CATALOG LOADING
+"""
+
+CACHE_MAGIC = b'AGSC'  # first four bytes of every compiled catalog file
+CACHE_VERSION = 3  # bump whenever the compiled layout changes so old caches get rebuilt
+CACHE_HEADER = struct.Struct('<4sIqqIIII')  # magic, version, source mtime_ns and size, then 4 array lengths
+SECTION_FIELDS = 10  # dept, level, section, crn, title, name, instructor, gen ed (string ids), then credits
+# (in hundredths) and seats (-1 if unknown), one row per section
+BLOCK_FIELDS = 3  # day bits, start minute, end minute, one row per meeting time
+
+
+def parse_time_block(time_string):
+    """Given a catalog time string, get its days and 24-hour start and end times.
+
+    Examples:
+    'TR 10:00 AM - 11:20 AM' → ('TR', '10:00', '11:20')
+    'W 7:00 PM - 9:50 PM' → ('W', '19:00', '21:50')
+    """
+    days, times = time_string.split(' ', 1)  # e.g. ['TR', '10:00 AM - 11:20 AM']
+    if not days.isalpha():
+        raise ValueError(f'no days in time block {time_string!r}')  # e.g. '1:00 PM - 5:00 PM'
+    start, end = times.split(' - ')  # e.g. ['10:00 AM', '11:20 AM']
+    return days, convert_24(start), convert_24(end)
+
+
+def day_bits(days):
+    """Given a days string, get an int with bit i set for DAYS[i], e.g. 'MWF' → 0b10101."""
+    return sum(1 << DAYS.index(day) for day in set(days))
+
+
+def days_from_bits(bits):
+    """The inverse of day_bits(), e.g. 0b10101 → 'MWF'."""
+    return ''.join(day for i, day in enumerate(DAYS) if bits >> i & 1)
+
+
+class Catalog:
+    """Every schedulable section in the course catalog, indexed by course name and by CRN.
+
+    The catalog is held as compact arrays (see compile_catalog()), and a section only becomes a
+    Course object the first time it is asked for, so loading doesn't pay for courses nobody requests.
+
+    Attributes:
+    by_name (dict) -- e.g. by_name['CSCI 205'] is the list of section ids of CSCI 205.
+    by_crn (dict) -- e.g. by_crn['50537'] is the section id with CRN 50537.
+    rejected (dict) -- Course code → reason, for entries that can't be scheduled (e.g. TBA times).
+    version (str) -- identifies the compiled layout and the source file it came from, e.g. for result caches.
+    """
+
+    def __init__(self, strings, sections, block_offsets, blocks, rejected, version=''):
+        self.strings = strings  # every distinct string, referenced by index from the arrays
+        self.sections = sections  # SECTION_FIELDS ints per section
+        self.block_offsets = block_offsets  # section i's blocks are rows block_offsets[i] to block_offsets[i + 1]
+        self.blocks = blocks  # BLOCK_FIELDS ints per meeting time
+        self.rejected = rejected
+        self.version = version
+        self.by_name = dict()
+        self.by_crn = dict()
+        for section_id in range(len(self)):
+            row = section_id * SECTION_FIELDS
+            self.by_name.setdefault(strings[sections[row + 5]], []).append(section_id)
+            self.by_crn[strings[sections[row + 3]]] = section_id
+        self.materialized = dict()  # section id → Course, filled in lazily by get_course()
+
+    def __len__(self):
+        return len(self.sections) // SECTION_FIELDS
+
+    @property
+    def courses(self):
+        """Every section as a Course object, in catalog order."""
+        return [self.get_course(section_id) for section_id in range(len(self))]
+
+    def get_course(self, section_id):
+        """Returns the Course object for a section id, building it on first use."""
+        if section_id not in self.materialized:
+            dept, level, section, crn, title, _, _, _, credits, seats = \
+                self.sections[section_id * SECTION_FIELDS:(section_id + 1) * SECTION_FIELDS]
+            course = None
+            for block in range(self.block_offsets[section_id], self.block_offsets[section_id + 1]):
+                bits, start, end = self.blocks[block * BLOCK_FIELDS:(block + 1) * BLOCK_FIELDS]
+                f_start, f_end, days = format_minutes(start), format_minutes(end), days_from_bits(bits)
+                if course is None:
+                    course = Course(self.strings[dept], self.strings[level], self.strings[section], f_start, f_end,
+                                    days, self.strings[crn], title=self.strings[title], credits=credits / 100,
+                                    seats=seats if seats >= 0 else None)
+                else:
+                    course.add_time_block(f_start, f_end, days)
+            self.materialized[section_id] = course
+        return self.materialized[section_id]
+
+    def get_fields(self, section_id):
+        """Returns a section's catalog text by field, e.g. {'name': 'CSCI 205', 'section': '01', 'crn': '10582',
+        'title': 'Software Engineering & Design', 'instructor': 'Romano, Lily R.', 'gen_ed': 'NSMC',
+        'department': 'CSCI'}."""
+        row = self.sections[section_id * SECTION_FIELDS:(section_id + 1) * SECTION_FIELDS]
+        dept, _, section, crn, title, name, instructor, gen_ed = (self.strings[string] for string in row[:8])
+        return {'name': name, 'section': section, 'crn': crn, 'title': title, 'instructor': instructor,
+                'gen_ed': gen_ed, 'department': dept}
+
+    def get_sections(self, *names):
+        """Returns every section of the given courses, e.g. get_sections('CSCI 205', 'CSCI 206')."""
+        return [self.get_course(section_id) for name in names for section_id in self.by_name.get(name, [])]
+
+    def get_electives(self, elective_num, *names, choose=1):
+        """Returns every section of the given courses as an Elective of the same pool, e.g.
+        get_electives(1, 'PHIL 100', 'PSYC 100') for 'ELECTIVE 1', or with choose, the sections for taking that
+        many distinct courses of the pool (see choose_electives()). The catalog's own courses are unchanged."""
+        electives = []
+        for course in self.get_sections(*names):
+            elective = Elective(course.dept, course.level, course.section, course.f_start, course.f_end, course.days,
+                                elective_num, course.crn, course.inclusive_end, course.title, course.credits,
+                                course.seats)
+            for days, start, end in course.time_blocks[1:]:
+                elective.add_time_block(format_minutes(start), format_minutes(end), days)
+            electives.append(elective)
+        return choose_electives(electives, choose)
+
+    def get_crns(self, *crns):
+        """Returns the sections with the given CRNs, e.g. get_crns('50537', '50860')."""
+        return [self.get_course(self.by_crn[crn]) for crn in crns]
+
+
+def parse_credits(entry):
+    """Given one course_data.json entry, get its credits, the lowest if they vary, e.g. '0.5 - 2' → 0.5."""
+    return float(entry['CR'][0].split(' - ')[0]) if entry.get('CR') else 0
+
+
+def parse_seats(entry):
+    """Given one course_data.json entry, get its unreserved seats available, e.g. 'Closed' → 0, or None
+    if the entry doesn't say (e.g. 'See Guide')."""
+    seats = entry.get('UNRES Seats Avail')
+    if seats and seats[0].isdigit():
+        return int(seats[0])
+    return 0 if seats == ['Closed'] else None
+
+
+def parse_entry(entry):
+    """Given one course_data.json entry, get its (dept, level, section, crn, title) strings and its list
+    of (days, start, end) meeting times. Raises ValueError if the entry can't be scheduled."""
+    department, level, section = entry['Course'][0].split()  # e.g. ['CSCI', '205', '01']
+    if not entry['Time']:
+        raise ValueError('it has no time entry')
+    if any('TBA' in time_string for time_string in entry['Time']):
+        raise ValueError('its time is TBA')
+    time_blocks = []
+    for time_string in entry['Time']:
+        days, f_start, f_end = parse_time_block(time_string)
+        time_blocks.append((days, f_start, f_end))
+    return (department, level, section, entry['Crn'][0], entry['Title'][0]), time_blocks
+
+
+def compile_catalog(entries, source_mtime_ns=0, source_size=0):
+    """Given the parsed catalog JSON, get the bytes of a compiled catalog.
+
+    Layout: CACHE_HEADER, then the section, block offset, and block arrays of 32-bit ints, then the
+    rejected entries as pairs of string ids, then every string joined by NUL bytes.
+    """
+    string_ids = dict()
+    sections, block_offsets, blocks, rejected = array('i'), array('i', [0]), array('i'), array('i')
+
+    def string_id(string):
+        return string_ids.setdefault(string, len(string_ids))
+
+    for entry in entries:
+        try:
+            fields, time_blocks = parse_entry(entry)
+        except ValueError as error:
+            rejected.extend((string_id(entry['Course'][0]), string_id(str(error))))
+            continue
+        department, level = fields[0], fields[1]
+        sections.extend(string_id(field) for field in fields)
+        sections.append(string_id(f'{department} {level}'))  # the course name, e.g. 'CSCI 205'
+        sections.append(string_id('; '.join(entry.get('Instructor', []))))  # e.g. 'Campbell, Claire E.; Newlin, ...'
+        sections.append(string_id(' '.join(entry.get('Gen Ed', []))))  # e.g. 'NSMC FRST'
+        seats = parse_seats(entry)
+        sections.extend((round(parse_credits(entry) * 100), -1 if seats is None else seats))
+        for days, f_start, f_end in time_blocks:
+            blocks.extend((day_bits(days), calc_minutes(f_start), calc_minutes(f_end)))
+        block_offsets.append(len(blocks) // BLOCK_FIELDS)
+
+    string_table = '\0'.join(string_ids).encode('utf-8')
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, source_mtime_ns, source_size, len(sections),
+                               len(blocks), len(rejected), len(string_table))
+    return b''.join((header, sections.tobytes(), block_offsets.tobytes(), blocks.tobytes(), rejected.tobytes(),
+                     string_table))
+
+
+def read_compiled_catalog(buffer, source_mtime_ns=None, source_size=None):
+    """Given the bytes (or an mmap) of a compiled catalog, get a Catalog whose arrays are views into
+    the buffer, or None if the buffer is from another version or another source file, or has the wrong size."""
+    if len(buffer) < CACHE_HEADER.size:
+        return None
+    magic, version, mtime_ns, size, section_ints, block_ints, rejected_ints, string_bytes = \
+        CACHE_HEADER.unpack_from(buffer)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    if source_mtime_ns is not None and (mtime_ns, size) != (source_mtime_ns, source_size):
+        return None  # the JSON has changed since this was compiled
+    lengths = (section_ints, section_ints // SECTION_FIELDS + 1, block_ints, rejected_ints)
+    if len(buffer) != CACHE_HEADER.size + sum(lengths) * 4 + string_bytes:
+        return None  # e.g. a cache that was truncated while it was written
+    view = memoryview(buffer)
+    offset = CACHE_HEADER.size
+    arrays = []
+    for length in lengths:
+        arrays.append(view[offset:offset + length * 4].cast('i'))  # no copy, just a typed window
+        offset += length * 4
+    strings = bytes(view[offset:offset + string_bytes]).decode('utf-8').split('\0')
+    sections, block_offsets, blocks, rejected_ids = arrays
+    rejected = {strings[rejected_ids[i]]: strings[rejected_ids[i + 1]] for i in range(0, len(rejected_ids), 2)}
+    return Catalog(strings, sections, block_offsets, blocks, rejected, f'{version}:{mtime_ns}:{size}')
+
+
+def load_catalog(path='course_data.json', cache_path=None):
+    """Load the catalog from its compiled cache, recompiling the JSON first if the cache is missing or
+    stale. The cache defaults to the JSON path with a .cache extension, e.g. course_data.cache."""
+    if cache_path is None:
+        cache_path = os.path.splitext(path)[0] + '.cache'
+    source = os.stat(path)
+    try:
+        with open(cache_path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)  # the mapping outlives the file object
+        catalog = read_compiled_catalog(buffer, source.st_mtime_ns, source.st_size)
+        if catalog is not None:
+            return catalog
+    except (OSError, ValueError):
+        pass  # no cache yet (or an empty one), so compile it below
+
+    with open(path, encoding='utf-8') as file:
+        compiled = compile_catalog(json.load(file), source.st_mtime_ns, source.st_size)
+    try:
+        temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(compiled)
+        os.replace(temporary_path, cache_path)  # readers never see a half-written cache
+    except OSError:
+        pass  # e.g. a read-only checkout, where the compiled bytes are still used from memory
+    return read_compiled_catalog(compiled)
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    catalog = load_catalog()
+    print(f"Loaded {len(catalog)} sections of {len(catalog.by_name)} courses ({len(catalog.rejected)} rejected).")
+    for course in catalog.get_sections('CSCI 205', 'CSCI 205L'):
+        print(course)
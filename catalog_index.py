@@ -0,0 +1,99 @@
+import re
+import time
+
+from catalog import load_catalog
+
+"""
+CATALOG SEARCH INDEX
+"""
+
+# field → weight of a match in it, so e.g. 'CSCI' in a course code outranks 'CSCI' in a title
+FIELD_WEIGHTS = {
+    'code': 8,  # e.g. 'CSCI 205 01', also searchable as 'CSCI205' and by CRN
+    'title': 4,
+    'instructor': 2,
+    'gen_ed': 1,
+}
+EXACT_BONUS = 2  # a whole-token match counts this many times more than a prefix match
+
+
+def tokenize(text):
+    """Given text, get its lowercase words, e.g. 'Software Engineering & Design' → ['software', 'engineering',
+    'design']."""
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+class CatalogIndex:
+    """Prefix and token indexes over every section of a Catalog, built once, for type-ahead search by course
+    code, CRN, title, instructor, gen ed, and department.
+
+    Every prefix of every token maps straight to the sections it matches and the best score of each match,
+    so a query only does one dict lookup per word and then intersects and ranks the (usually few) sections.
+
+    Attributes:
+    prefixes (dict) -- e.g. prefixes['eng'] maps the id of each section with a word starting with 'eng' to its score.
+    names (list) -- each section's course name, e.g. names[0] == 'ACFM 104'.
+    titles (dict) -- course name → title.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.prefixes = dict()
+        self.names = []
+        self.titles = dict()
+        for section_id in range(len(catalog)):
+            fields = catalog.get_fields(section_id)
+            self.names.append(fields['name'])
+            self.titles.setdefault(fields['name'], fields['title'])
+            texts = {
+                'code': f"{fields['name']} {fields['section']} {fields['crn']} {fields['name'].replace(' ', '')}",
+                'title': fields['title'],
+                'instructor': fields['instructor'],
+                'gen_ed': fields['gen_ed'],
+            }  # the department is the first word of the code, e.g. 'csci'
+            for field, text in texts.items():
+                for token in tokenize(text):
+                    for length in range(1, len(token) + 1):
+                        score = FIELD_WEIGHTS[field] * (EXACT_BONUS if length == len(token) else 1)
+                        matches = self.prefixes.setdefault(token[:length], dict())
+                        if matches.get(section_id, 0) < score:
+                            matches[section_id] = score
+
+    def search(self, query, limit=10):
+        """Returns the courses best matching a query as (name, title, section ids) triples, best first, where
+        every word of the query must start a word of the section, e.g. search('soft eng') or search('csci 2').
+        Only the matching sections of each course are listed, e.g. just the ones taught by a given instructor."""
+        words = tokenize(query)
+        if not words:
+            return []
+        matches = sorted((self.prefixes.get(word, dict()) for word in words), key=len)  # intersect from the rarest
+        scores = dict(matches[0])
+        for word_matches in matches[1:]:
+            scores = {section_id: score + word_matches[section_id] for section_id, score in scores.items()
+                      if section_id in word_matches}
+        courses = dict()  # name → [best score, section ids]
+        for section_id, score in scores.items():
+            course = courses.setdefault(self.names[section_id], [0, []])
+            course[0] = max(course[0], score)
+            course[1].append(section_id)
+        ranked = sorted(courses.items(), key=lambda item: (-item[1][0], item[0]))[:limit]  # then by name
+        return [(name, self.titles[name], sorted(section_ids)) for name, (_, section_ids) in ranked]
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    catalog = load_catalog()
+    start = time.perf_counter()
+    index = CatalogIndex(catalog)
+    print(f"Indexed {len(catalog)} sections under {len(index.prefixes)} prefixes in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms.")
+    for query in ['csci 20', 'soft eng', 'romano', 'nsmc lab', 'psyc']:
+        start = time.perf_counter()
+        results = index.search(query, limit=5)
+        print(f"{query!r} ({(time.perf_counter() - start) * 1000:.3f} ms):")
+        for name, title, section_ids in results:
+            print(f"    {name} {title} ({len(section_ids)} sections)")
@@ -0,0 +1,129 @@
+import time
+
+from catalog import BLOCK_FIELDS, load_catalog
+from main import DAYS, INCLUSIVE_END, SLOT_MINUTES, time_mask
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional: without it, CatalogView falls back to occupancy masks
+    np = None
+
+"""
+CATALOG VIEW
+"""
+
+QUERY_CHUNK = 4096  # query rows compared against the catalog at once, to bound the size of the overlap matrix
+
+
+def slot_range(start, end, inclusive_end=INCLUSIVE_END):
+    """Given start and end minutes, get the first and last slot they occupy, the same slots time_mask() sets,
+    e.g. (540, 590) → (540, 590). The last slot is before the first when nothing is occupied."""
+    last_slot = end // SLOT_MINUTES if inclusive_end else -(-end // SLOT_MINUTES) - 1
+    return start // SLOT_MINUTES, last_slot
+
+
+def meeting_rows(course):
+    """Given a course (or bundle), get one (day, first slot, last slot) row per day of each of its meeting
+    times, e.g. [(0, 540, 590), (2, 540, 590), (4, 540, 590)] for MWF 09:00 - 09:50."""
+    rows = []
+    for days, start, end in course.time_blocks:
+        first_slot, last_slot = slot_range(start, end, course.inclusive_end)
+        if first_slot <= last_slot:
+            rows.extend((DAYS.index(day), first_slot, last_slot) for day in days)
+    return rows
+
+
+class CatalogView:
+    """Every section of a Catalog as dense arrays of meeting rows, for asking which sections still fit
+    alongside a partial schedule, without building a Course for each section.
+
+    With numpy, each row is one day of one meeting time: days[i], first_slots[i] and last_slots[i] (in
+    SLOT_MINUTES slots, so conflicts agree exactly with Course.is_conflicting_with()) belong to section
+    section_ids[i]. A query compares all of its rows with all of the catalog's rows of the same day at once.
+    Without numpy, each section's occupancy mask is ANDed with the query's instead.
+    """
+
+    def __init__(self, catalog, inclusive_end=INCLUSIVE_END):
+        self.catalog = catalog
+        self.inclusive_end = inclusive_end  # how the catalog's sections are turned into slots
+        self.vectorized = np is not None  # whether queries use the arrays below or self.masks
+        self.masks = []  # section id → occupancy mask, only used without numpy
+        rows = []  # (day, first slot, last slot, section id)
+        for section_id in range(len(catalog)):
+            mask = 0
+            for block in range(catalog.block_offsets[section_id], catalog.block_offsets[section_id + 1]):
+                bits, start, end = catalog.blocks[block * BLOCK_FIELDS:(block + 1) * BLOCK_FIELDS]
+                days = [day for day in range(len(DAYS)) if bits >> day & 1]
+                if not self.vectorized:
+                    mask |= time_mask(start, end, [DAYS[day] for day in days], inclusive_end)
+                    continue
+                first_slot, last_slot = slot_range(start, end, inclusive_end)
+                if first_slot <= last_slot:
+                    rows.extend((day, first_slot, last_slot, section_id) for day in days)
+            self.masks.append(mask)
+        if self.vectorized:
+            rows = np.array(rows, dtype=np.int32).reshape(-1, 4)
+            rows = rows[np.argsort(rows[:, 0], kind='stable')]  # by day, so each day's rows are one slice
+            self.days, self.first_slots, self.last_slots, self.section_ids = rows.T.copy()
+            self.day_offsets = np.searchsorted(self.days, np.arange(len(DAYS) + 1))  # day d: [d] to [d + 1]
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def fits(self, courses):
+        """Returns the ids of every section that conflicts with none of the courses, e.g. the sections
+        that still fit a partial schedule's courses, in catalog order."""
+        return self.fits_each([courses])[0]
+
+    def fits_each(self, schedules):
+        """Given a list of candidate schedules, each a list of courses, get the fits() of each of them."""
+        if not self.vectorized:
+            fits = []
+            for courses in schedules:
+                occupied = 0
+                for course in courses:
+                    occupied |= course.mask
+                fits.append([section_id for section_id, mask in enumerate(self.masks) if not mask & occupied])
+            return fits
+        query = [(*row, schedule_num) for schedule_num, courses in enumerate(schedules)
+                 for course in courses for row in meeting_rows(course)]
+        conflicts = np.zeros((len(schedules), len(self)), dtype=bool)  # schedule → section → conflicts
+        if query:
+            query = np.array(query, dtype=np.int32)
+            query = query[np.argsort(query[:, 0], kind='stable')]
+            query_offsets = np.searchsorted(query[:, 0], np.arange(len(DAYS) + 1))
+            for day in range(len(DAYS)):
+                rows = slice(self.day_offsets[day], self.day_offsets[day + 1])
+                first_slots, last_slots = self.first_slots[rows, None], self.last_slots[rows, None]
+                for chunk_start in range(query_offsets[day], query_offsets[day + 1], QUERY_CHUNK):
+                    chunk = query[chunk_start:min(chunk_start + QUERY_CHUNK, query_offsets[day + 1])]
+                    overlapping = (first_slots <= chunk[:, 2]) & (chunk[:, 1] <= last_slots)  # rows × chunk
+                    row_nums, query_nums = np.nonzero(overlapping)
+                    conflicts[chunk[query_nums, 3], self.section_ids[rows][row_nums]] = True
+        return [np.flatnonzero(~section_conflicts).tolist() for section_conflicts in conflicts]
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    from main import AGS
+
+    catalog = load_catalog()
+    start = time.perf_counter()
+    view = CatalogView(catalog)
+    print(f"Viewed {len(view)} sections ({'numpy' if view.vectorized else 'masks'}) in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms.")
+    candidates = [schedule.courses for schedule in AGS(catalog.get_sections('CSCI 205', 'CSCI 206', 'MATH 201'))
+                  .iter_schedules(100)]
+    chosen = candidates[0]
+    start = time.perf_counter()
+    section_ids = view.fits(chosen)
+    print(f"{len(section_ids)} sections fit {', '.join(course.name for course in chosen)} "
+          f"({(time.perf_counter() - start) * 1000:.2f} ms).")
+    start = time.perf_counter()
+    fits = view.fits_each(candidates)
+    print(f"Sections fitting each of {len(candidates)} candidate schedules: {min(map(len, fits))} to "
+          f"{max(map(len, fits))} ({(time.perf_counter() - start) * 1000:.2f} ms).")
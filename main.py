@@ -1,9 +1,21 @@
+import contextlib
 import copy
+import heapq
+import itertools
+import math
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 """
 HELPER FUNCTIONS
 """
 
+DAYS = 'MTWRFSU'  # day characters in the order their slots are packed into an occupancy mask
+SLOT_MINUTES = 1  # granularity of an occupancy mask, e.g. 09:00 - 09:50 covers slots 540 through 590
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES  # e.g. 1440 one-minute slots per day, 7 * 1440 bits per mask
+INCLUSIVE_END = True  # by default a course ending at 09:50 conflicts with one starting at 09:50
+
 
 def calc_minutes(time_string):
     """Given a string 'hh:mm', get the number of minutes past since 00:00."""
@@ -13,6 +25,45 @@ def calc_minutes(time_string):
     return hour * 60 + minutes  # e.g. return 896
 
 
+def format_minutes(minutes):
+    """Given a number of minutes past since 00:00, get the string 'hh:mm' (the inverse of calc_minutes())."""
+    return f'{minutes // 60:02}:{minutes % 60:02}'  # e.g. 896 becomes '14:56'
+
+
+def convert_24(time_string):
+    """Given a string 'h:mm AM' or 'h:mm PM', get the 24-hour string 'hh:mm'."""
+    time, period = time_string.split()  # e.g. ['2:56', 'PM']
+    hour, minutes = time.split(':')  # e.g. ['2', '56']
+    hour = int(hour) % 12  # e.g. 12 AM becomes hour 0
+    if period.upper() == 'PM':
+        hour += 12  # e.g. 2 PM becomes hour 14
+    return f'{hour:02}:{minutes}'  # e.g. return '14:56'
+
+
+def time_mask(start, end, days, inclusive_end=INCLUSIVE_END):
+    """Given start and end minutes and a days string, get an int with one bit set per occupied slot.
+
+    Two masks conflict exactly when they share a bit, i.e. when mask_a & mask_b is nonzero. With
+    inclusive_end, the slot containing the end minute is occupied too, so back-to-back courses conflict.
+    Times must be multiples of SLOT_MINUTES, so that masks agree with comparing the exact minutes; with
+    one-minute slots, every time is.
+    """
+    if start % SLOT_MINUTES or end % SLOT_MINUTES:
+        raise ValueError(f'{format_minutes(start)} - {format_minutes(end)} is not on a {SLOT_MINUTES}-minute slot')
+    first_slot = start // SLOT_MINUTES  # e.g. 540
+    if inclusive_end:
+        last_slot = end // SLOT_MINUTES  # e.g. 590, shared with a course starting at 09:50
+    else:
+        last_slot = -(-end // SLOT_MINUTES) - 1  # e.g. 589, so a course starting at 09:50 fits right after
+    if last_slot < first_slot:
+        return 0  # e.g. a zero-length exclusive block occupies nothing
+    day_bits = ((1 << (last_slot - first_slot + 1)) - 1) << first_slot  # the occupied slots of a single day
+    mask = 0
+    for day in days:  # e.g. for 'M', 'W', and 'F' in 'MWF'
+        mask |= day_bits << (DAYS.index(day) * SLOTS_PER_DAY)  # shift the day's slots into that day's place
+    return mask
+
+
 """
 COURSE, ELECTIVE, AND SCHEDULE CLASS DEFINITIONS
 """
@@ -21,7 +72,8 @@ COURSE, ELECTIVE, AND SCHEDULE CLASS DEFINITIONS
 class Course:
     """Course object class."""
 
-    def __init__(self, department, level, section, f_start, f_end, days, crn=''):
+    def __init__(self, department, level, section, f_start, f_end, days, crn='', inclusive_end=INCLUSIVE_END,
+                 title='', credits=0, seats=None):
         self.dept = department  # e.g. 'CSCI'
         self.level = level  # e.g. '205'
         self.name = f'{self.dept} {self.level}'  # e.g. 'CSCI 205'
@@ -32,18 +84,50 @@ class Course:
         self.end = calc_minutes(f_end)  # e.g. 590 (in minutes)
         self.days = days  # e.g. 'MWF'
         self.crn = crn  # e.g. '50537'
+        self.title = title  # e.g. 'Software Engineering'
+        self.credits = credits  # e.g. 1 for a full course, 0.25 for a lab (the lowest value if it varies)
+        self.seats = seats  # unreserved seats available, e.g. 0 when closed, or None if unknown
         self.group = self.name  # e.g. 'CSCI 205' (group attribute is the same as name for required courses)
+        self.corequisite = f'{self.dept} {self.level.rstrip(string.ascii_uppercase)}'  # e.g. 'CSCI 206' for 206L
+        self.links = []  # sections of its corequisites it must be taken with, if restricted (see link())
+        self.pool = None  # e.g. 'ELECTIVE 1' for the sections of an elective pool, see choose_electives()
+        self.slot = 0  # which pick of its pool the section is for, e.g. 1 in 'ELECTIVE 1.2'
+        self.inclusive_end = inclusive_end
+        self.time_blocks = [(self.days, self.start, self.end)]  # every meeting time, e.g. [('MWF', 540, 590)]
+        self.mask = time_mask(self.start, self.end, self.days, inclusive_end)  # occupied slots, see time_mask()
 
     def __repr__(self):
-        return f"{f'<{self.crn}> {self.group} → {self.name}-{self.section:02} ({self.f_start} - {self.f_end})'}"
+        extra_blocks = ''.join(f' ({days} {format_minutes(start)} - {format_minutes(end)})'
+                               for days, start, end in self.time_blocks[1:])  # e.g. a weekly evening exam block
+        return f'<{self.crn}> {self.group} → {self.name}-{self.section:02} ({self.f_start} - {self.f_end})' \
+               f'{extra_blocks}'
+
+    def add_time_block(self, f_start, f_end, days):
+        """Add another meeting time, e.g. add_time_block('19:00', '21:50', 'W') for a weekly evening block.
+        The course's mask covers every block, so conflict checks account for all of them."""
+        start = calc_minutes(f_start)
+        end = calc_minutes(f_end)
+        self.time_blocks.append((days, start, end))
+        self.mask |= time_mask(start, end, days, self.inclusive_end)
 
     def is_conflicting_with(self, other):
         """Returns True if times overlap on the same day."""
-        for day in self.days:  # e.g. for 'M', 'W', and 'F' in 'MWF'
-            if day in other.days:  # e.g. if 'M' in 'MTW'
-                if (self.start <= other.start <= self.end) or (other.start <= self.start <= other.end):
-                    return True  # this is the case where it's the same day and times overlap
-        return False
+        return self.mask & other.mask != 0  # any shared slot means the same day and overlapping times
+
+    def link(self, *others):
+        """Restrict which corequisite sections this section can be taken with, e.g. lecture.link(lab_60, lab_61)
+        means that of the lecture's labs, only lab 60 or lab 61 can be in its CorequisiteBundle. Links go both ways."""
+        for other in others:
+            self.links.append(other)
+            other.links.append(self)
+
+    def is_linkable_with(self, other):
+        """Returns True unless links rule out taking the two sections together."""
+        for course, partner in ((self, other), (other, self)):
+            linked = [link for link in course.links if link.name == partner.name]
+            if linked and partner not in linked:
+                return False
+        return True
 
 
 class Elective(Course):
@@ -52,57 +136,576 @@ class Elective(Course):
     allows electives of equal interchangeability to be grouped in pools.
     """
 
-    def __init__(self, department, level, section, start, end, days, elective_num, crn=''):
-        super().__init__(department, level, section, start, end, days, crn)
+    def __init__(self, department, level, section, start, end, days, elective_num, crn='', inclusive_end=INCLUSIVE_END,
+                 title='', credits=0, seats=None):
+        super().__init__(department, level, section, start, end, days, crn, inclusive_end, title, credits, seats)
         self.group = f'ELECTIVE {elective_num}'  # e.g. 'ELECTIVE 3' indicates the group this elective is picked from
+        self.pool = self.group
+
+
+class CorequisiteBundle:
+    """A lecture together with the lab, recitation, etc. sections that have to be taken with it. The search
+    picks a whole bundle at once, and it behaves like a single Course with the combined meeting times."""
+
+    def __init__(self, courses):
+        self.courses = list(courses)  # e.g. [CSCI 206-01, CSCI 206L-60]
+        self.group = self.courses[0].corequisite  # e.g. 'CSCI 206'
+        self.name = ' + '.join(course.name for course in self.courses)  # e.g. 'CSCI 206 + CSCI 206L'
+        self.pool = None  # only required courses are bundled
+        self.slot = 0
+        self.inclusive_end = self.courses[0].inclusive_end
+        self.time_blocks = [block for course in self.courses for block in course.time_blocks]
+        self.credits = sum(course.credits for course in self.courses)
+        self.mask = 0
+        for course in self.courses:
+            self.mask |= course.mask  # the combined occupancy, computed once
+
+    def __repr__(self):
+        return ' + '.join(f'<{course.crn}>' for course in self.courses)
+
+    def is_conflicting_with(self, other):
+        """Returns True if times overlap on the same day."""
+        return self.mask & other.mask != 0
+
+
+def choose_electives(electives, choose):
+    """Given the sections of one elective pool (Electives of the same group), get the sections to supply so
+    that choose distinct courses of the pool are taken: one copy of every section per pick, in groups
+    'ELECTIVE n.1' to 'ELECTIVE n.<choose>'. Picks are ordered by course name (see in_pool_order()), so each
+    combination of courses is searched once, instead of once per ordering as with duplicate pools."""
+    if choose == 1:
+        return list(electives)
+    sections = []
+    for slot in range(choose):
+        copies = dict()  # original → its copy for this pick
+        for elective in electives:
+            section = copy.copy(elective)
+            section.group = f'{elective.pool}.{slot + 1}'  # e.g. 'ELECTIVE 1.2'
+            section.slot = slot
+            section.time_blocks = list(elective.time_blocks)
+            copies[elective] = section
+        for elective, section in copies.items():
+            section.links = [copies.get(link, link) for link in elective.links]
+        sections.extend(copies.values())
+    return sections
+
+
+def in_pool_order(unit1, unit2):
+    """Returns False when two units are different picks of the same pool (see choose_electives()) that can't be
+    taken together: the same course twice, or two courses out of name order, e.g. PSYC 100 for pick 1 with
+    PHIL 100 for pick 2 (PHIL 100 for pick 1 with PSYC 100 for pick 2 is the same combination)."""
+    if unit1.pool is None or unit1.pool != unit2.pool or unit1.slot == unit2.slot:
+        return True
+    return unit1.name != unit2.name and (unit1.slot < unit2.slot) == (unit1.name < unit2.name)
+
+
+def bundle_corequisites(courses):
+    """Given courses, replace the sections of required courses that are corequisites of each other (same
+    corequisite, e.g. 'CSCI 206' and 'CSCI 206L') with every CorequisiteBundle of one section per course
+    that is free of internal conflicts and allowed by links. Other courses are returned unchanged. Raises a
+    ValueError when no combination is valid, since leaving the course out would search schedules without it."""
+    corequisites = dict()  # e.g. {'CSCI 206': {'CSCI 206': [...], 'CSCI 206L': [...]}}
+    for course in courses:
+        if course.group == course.name:  # electives are picked from pools instead
+            corequisites.setdefault(course.corequisite, dict()).setdefault(course.name, []).append(course)
+    units = []
+    for course in courses:
+        names = corequisites.get(course.corequisite) if course.group == course.name else None
+        if not names or len(names) == 1:
+            units.append(course)  # nothing to bundle it with
+        elif course is names[min(names, key=len)][0]:  # build the bundles once, where the lecture first appears
+            sections = [names[name] for name in sorted(names, key=lambda name: (len(name), name))]  # lecture first
+            num_units = len(units)
+            for combination in itertools.product(*sections):
+                if all(not a.is_conflicting_with(b) and a.is_linkable_with(b)
+                       for a, b in itertools.combinations(combination, 2)):
+                    units.append(CorequisiteBundle(combination))
+            if len(units) == num_units:
+                raise ValueError(f'{course.corequisite} has no valid corequisite bundle: every combination of its '
+                                 f'sections has a conflict or is ruled out by links')
+    return units
 
 
 class Schedule:
     """Schedule object class."""
 
-    def __init__(self):
+    def __init__(self, courses=None):
         self.courses = []  # schedules initially have no courses
         self.has_conflict = False  # having no courses means no conflict
+        self.mask = 0  # the OR of every course's mask, i.e. all slots occupied so far
+        self.credits = 0  # the total credits so far
+        self.history = []  # (has_conflict, mask, credits) as they were before each course was added, see pop_course()
+        for course in courses or []:
+            self.add_course(course)
 
     def __repr__(self):
-        s = f"┌{'─' * 63}\n"
-        for course in self.courses:
-            s += f'│ {course}\n'
-        s += f"└{'─' * 63}"
-        return s
+        lines = [f"┌{'─' * 63}"]
+        lines.extend(f'│ {course}' for course in self.courses)
+        lines.append(f"└{'─' * 63}")
+        return '\n'.join(lines)  # joined once, not rebuilt for every course
 
     def add_course(self, course_to_add):
-        for course in self.courses:  # for every course currently in the schedule...
-            if course_to_add.is_conflicting_with(course):  # if it conflicts with the course to add...
-                self.has_conflict = True  # mark the schedule as having a conflict
+        self.history.append((self.has_conflict, self.mask, self.credits))  # so the addition can be undone
+        if self.mask & course_to_add.mask:  # if it shares a slot with any course currently in the schedule...
+            self.has_conflict = True  # mark the schedule as having a conflict
+        self.mask |= course_to_add.mask
+        self.credits += course_to_add.credits
         self.courses.append(course_to_add)  # always add course to schedule regardless
 
+    def pop_course(self):
+        """Undo the most recent add_course() and return the course that was removed."""
+        self.has_conflict, self.mask, self.credits = self.history.pop()  # the state from before the course was added
+        return self.courses.pop()
+
+    def daily_blocks(self):
+        """Returns each day's meeting times sorted by start, e.g. {'M': [(540, 590), (660, 710)], ...}."""
+        days = dict()
+        for course in self.courses:
+            for block_days, start, end in course.time_blocks:
+                for day in block_days:
+                    days.setdefault(day, []).append((start, end))
+        for blocks in days.values():
+            blocks.sort()
+        return days
+
+    def copy(self, courses=None):
+        """Returns a new schedule sharing this schedule's Course objects (the courses themselves are not copied).
+        Given courses with the same meeting times and credits as this schedule's, the copy holds those instead,
+        but then its additions can't be undone with pop_course()."""
+        schedule = Schedule()
+        schedule.has_conflict = self.has_conflict
+        schedule.mask = self.mask
+        schedule.credits = self.credits
+        if courses is None:
+            schedule.courses = self.courses[:]
+            schedule.history = self.history[:]
+        else:
+            schedule.courses = courses
+        return schedule
+
+    @classmethod
+    def from_courses(cls, courses):
+        """Returns a schedule of the given courses like Schedule(courses), but without the history of
+        pop_course() (one mask per course), e.g. for results rebuilt from a cache, which are never searched."""
+        schedule = cls()
+        for course in courses:
+            if schedule.mask & course.mask:
+                schedule.has_conflict = True
+            schedule.mask |= course.mask
+            schedule.credits += course.credits
+        schedule.courses = list(courses)
+        return schedule
+
+
+"""
+SCHEDULE PREFERENCES (lower is better)
+"""
+
+EARLY_START = 10 * 60  # classes before 10:00 count against early_start()
+
+
+def campus_time(schedule):
+    """Minutes from the first start to the last end of each day, summed over the week."""
+    return sum(max(end for _, end in blocks) - blocks[0][0] for blocks in schedule.daily_blocks().values())
+
+
+def days_on_campus(schedule):
+    """Number of days with at least one class, so fewer means more free days."""
+    return len(schedule.daily_blocks())
+
+
+def early_start(schedule):
+    """Minutes before EARLY_START that each day's first class starts, summed over the week."""
+    return sum(max(0, EARLY_START - blocks[0][0]) for blocks in schedule.daily_blocks().values())
+
+
+def gaps(schedule):
+    """Minutes spent waiting between classes, summed over the week."""
+    total = 0
+    for blocks in schedule.daily_blocks().values():
+        busy_until = blocks[0][1]
+        for start, end in blocks[1:]:
+            total += max(0, start - busy_until)  # e.g. 10 minutes between 09:50 and 10:00
+            busy_until = max(busy_until, end)
+    return total
+
+
+# name → (function, monotone). A monotone preference never decreases as courses are added, so its value
+# for a partial schedule is a lower bound for every completion and can be used to prune the search.
+PREFERENCES = {
+    'campus_time': (campus_time, True),
+    'days_on_campus': (days_on_campus, True),
+    'early_start': (early_start, True),
+    'gaps': (gaps, False),  # filling a gap with a class makes it smaller, so gaps are only scored at the end
+}
+
+
+def preference_score(preferences):
+    """Given preference names mapped to non-negative weights, e.g. {'gaps': 1, 'days_on_campus': 60}, get
+    a score function for finished schedules and a bound function for partial ones (see AGS.best_schedules())."""
+    if any(weight < 0 for weight in preferences.values()):
+        raise ValueError('preference weights must be non-negative')
+    weighted = [(PREFERENCES[name], weight) for name, weight in preferences.items()]
+
+    def score(schedule):
+        return sum(weight * function(schedule) for (function, _), weight in weighted)
+
+    def bound(schedule):
+        return sum(weight * function(schedule) for (function, monotone), weight in weighted if monotone)
+
+    return score, bound
+
+
+"""
+SEARCH STATISTICS
+"""
+
+
+class SearchCancelled(Exception):
+    """Raised by a search whose AGS.cancel token has been set."""
+
+
+class SearchStats:
+    """Opt-in instrumentation for one AGS, e.g. AGS(courses, stats=SearchStats()). Without it, the search
+    only pays for an `is not None` check per node and per course tried.
+
+    Attributes:
+    phases (dict) -- phase → seconds spent in it, e.g. {'bundle': ..., 'compatibility': ..., 'refresh': ...,
+        'search': ..., 'output': ...}. A lazy search is only timed while it is producing schedules.
+    nodes (int) -- generate_schedules() calls, like AGS.num_recursions.
+    pruned (dict) -- depth → branches cut there by forward checking, credits, or a prune function.
+    conflict_checks (int) -- pairs of sections compared in prepare(), plus courses checked against a
+        partial schedule's allowed bitset during the search.
+    schedule_copies (int) -- finished schedules copied out of the shared partial schedule.
+    peak_depth (int) -- the most courses a partial schedule held.
+    profiler -- optional, anything with enable() and disable(), e.g. cProfile.Profile(), switched on for
+        every timed phase (or an adapter for a sampling profiler, e.g. one calling start() and stop()).
+    """
+
+    def __init__(self, profiler=None):
+        self.phases = dict()
+        self.nodes = 0
+        self.pruned = dict()
+        self.conflict_checks = 0
+        self.schedule_copies = 0
+        self.peak_depth = 0
+        self.profiler = profiler
+
+    def __repr__(self):
+        return f'SearchStats({self.as_dict()})'
+
+    def as_dict(self):
+        return {'phases': dict(self.phases), 'nodes': self.nodes, 'pruned': dict(self.pruned),
+                'conflict_checks': self.conflict_checks, 'schedule_copies': self.schedule_copies,
+                'peak_depth': self.peak_depth}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Add the time spent in the with block to phases[name], profiling it if there is a profiler."""
+        if self.profiler is not None:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+            if self.profiler is not None:
+                self.profiler.disable()
+
+    def timed(self, name, iterable):
+        """Yield from iterable, adding only the time spent producing each item to phases[name]."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def prune(self, depth):
+        self.pruned[depth] = self.pruned.get(depth, 0) + 1
+
 
 """
 A GOOD SCHEDULER CLASS AND ITS SCHEDULING ALGORITHM
 """
 
+SUBTREE_CACHE_SIZE = 1_000_000  # most subtrees AGS.cached_schedules() keeps before starting over
+
 
 class AGS:
     """A Good Scheduler (AGS), the fundamental class that handles the
     generation of all course combinations and sorts schedules."""
 
-    def __init__(self, supplied_courses):
+    def __init__(self, supplied_courses, compatible=None, bundle=True, stats=None):
         self.supplied_courses = supplied_courses  # list of Course and Elective objects
+        self.bundle = bundle  # whether corequisites are searched as CorequisiteBundle units
+        self.stats = stats  # a SearchStats to record into, or None
+        self.cancel = None  # e.g. a threading.Event; once it is set, the search raises SearchCancelled
         self.schedules = []  # initially, no schedules have been generated
         self.non_conflicting_schedules = []  # no non-conflicting schedules either
         self.num_recursions = 0  # initially, build_schedules() has not been called
+        self.removed = 0  # bitset of sections no longer supplied, e.g. after remove_section()
+        self.excluded_courses = set()  # courses ruled out by exclude(), until include()
+        self.pinned_courses = set()  # courses given by pin(), until unpin()
+        self.excluded = 0  # bitset of sections ruled out by them, rebuilt by refresh()
+        self.blocked = 0  # occupancy mask of the times no section may use, see block_times()
+        self.min_seats = 0  # sections with fewer known seats are left out, see require_seats()
+        self.credit_range = None  # (low, high) credits every schedule must total, see limit_credits()
+        self.subtrees = dict()  # (depth, allowed, credits) → the subtree below it, kept by cached_schedules()
+        self.subtree_groups = None  # the group order and credit range self.subtrees was built with
+        self.prepare(compatible)
+
+    def prepare(self, compatible=None):
+        """Precompute which supplied courses are compatible with each other, once, before any search.
+
+        Corequisites are first combined into CorequisiteBundle units (see bundle_corequisites()), which
+        the rest of the search treats like courses. Each course gets an index into self.sections, and
+        self.compatible[i] is a bitset with bit j set when courses i and j don't conflict (and are in_pool_order()),
+        so picks of a choose-k pool are pruned by the same checks as conflicts. Bitsets that
+        were already computed for the same courses can be passed in as compatible to skip the pairwise
+        checks. The rest is done by refresh().
+        """
+        with self.phase('bundle'):
+            if self.bundle:
+                self.sections = bundle_corequisites(self.supplied_courses)  # e.g. self.sections[3] has index 3
+            else:
+                self.sections = list(self.supplied_courses)
+            self.section_index = {course: i for i, course in enumerate(self.sections)}
+        with self.phase('compatibility'):
+            if compatible is not None:
+                self.compatible = list(compatible)
+            else:
+                self.compatible = [0] * len(self.sections)
+                for i, course in enumerate(self.sections):  # O(n²) pairwise checks, done only here
+                    for j in range(i + 1, len(self.sections)):
+                        if not course.is_conflicting_with(self.sections[j]) and \
+                                in_pool_order(course, self.sections[j]):
+                            self.compatible[i] |= 1 << j
+                            self.compatible[j] |= 1 << i
+                if self.stats is not None:
+                    self.stats.conflict_checks += len(self.sections) * (len(self.sections) - 1) // 2
+        with self.phase('refresh'):
+            self.refresh()
+
+    def phase(self, name):
+        """Returns a context manager timing a phase into self.stats, or one that does nothing without stats."""
+        return self.stats.phase(name) if self.stats is not None else contextlib.nullcontext()
+
+    def timed(self, schedules):
+        """Returns the schedules with the time spent producing them added to the 'search' phase of self.stats."""
+        return self.stats.timed('search', schedules) if self.stats is not None else schedules
+
+    def refresh(self):
+        """Recompute everything that depends on which sections are removed, excluded, or ruled out by
+        constraints, without redoing any pairwise checks.
+
+        Sections with an excluded course, or in the group of a pinned course without it, are marked in
+        self.excluded, so exclusions follow a course into whatever bundles it is in after add_section() or
+        remove_section(). Sections that break a unary constraint (blocked times, too few seats) are marked
+        in self.unsuitable.
+        Courses that conflict with every course of some other group can't be in any valid schedule, so
+        they are left out of self.viable, the bitset the search starts from, and counted in
+        self.num_removed_sections. Interchangeable sections are then grouped under representatives.
+        """
+        active = (1 << len(self.sections)) - 1 & ~self.removed
+        self.group_bits = dict()  # e.g. {'CSCI 205': 0b110} has a bit set for each course in the group
+        for i, course in enumerate(self.sections):
+            if active >> i & 1:
+                self.group_bits[course.group] = self.group_bits.get(course.group, 0) | 1 << i
+        self.excluded = 0
+        pinned_units = dict()  # pinned course → bitset of the sections it is in
+        for i, section in enumerate(self.sections):
+            if active >> i & 1:
+                for course in getattr(section, 'courses', [section]):
+                    if course in self.excluded_courses:
+                        self.excluded |= 1 << i
+                    if course in self.pinned_courses:
+                        pinned_units[course] = pinned_units.get(course, 0) | 1 << i
+        for course in self.pinned_courses:
+            if course in pinned_units:
+                units = pinned_units[course]
+                self.excluded |= self.group_bits[self.sections[units.bit_length() - 1].group] & ~units
+            elif course in self.supplied_courses:  # e.g. a lab that fits none of the lectures since it was pinned
+                self.excluded |= self.group_bits.get(course.corequisite, 0)
+        self.unsuitable = 0
+        for i, section in enumerate(self.sections):
+            if section.mask & self.blocked or any(course.seats is not None and course.seats < self.min_seats
+                                                  for course in getattr(section, 'courses', [section])):
+                self.unsuitable |= 1 << i
+        wanted = active & ~self.excluded & ~self.unsuitable
+        self.viable = wanted  # every course the user still wants starts out viable
+        removed_one = True
+        while removed_one:  # removing a course can leave another one with no partner, so repeat until stable
+            removed_one = False
+            for i, course in enumerate(self.sections):
+                if not self.viable >> i & 1:
+                    continue  # already removed
+                for group, bits in self.group_bits.items():
+                    if group != course.group and not self.compatible[i] & self.viable & bits:
+                        self.viable &= ~(1 << i)  # it conflicts with every viable course of this group
+                        removed_one = True
+                        break
+        self.num_removed_sections = bin(wanted).count('1') - bin(self.viable).count('1')
+
+        # Sections of the same course that meet at exactly the same times (e.g. taught by different instructors)
+        # are interchangeable, so the search only tries the first one, its representative, and each schedule
+        # of representatives is expanded back into every combination of interchangeable sections at the end.
+        self.equivalents = dict()  # representative → every section it stands for, itself included
+        self.expansions = dict()  # representative → the courses of each of its equivalents, bundles unpacked
+        representative_of = dict()  # (group, name, mask, credits) → representative
+        representatives = 0  # bitset of the representatives
+        for i, course in enumerate(self.sections):
+            if not wanted >> i & 1:
+                continue  # never expand into a removed or excluded section
+            key = (course.group, course.name, course.mask, course.credits)
+            if key not in representative_of:
+                representative_of[key] = course
+                self.equivalents[course] = []
+                self.expansions[course] = []
+                representatives |= 1 << i
+            representative = representative_of[key]
+            self.equivalents[representative].append(course)
+            self.expansions[representative].append(course.courses if isinstance(course, CorequisiteBundle)
+                                                   else [course])
+        self.searchable = self.viable & representatives  # where every search starts
+        self.group_credits = dict()  # group → (fewest, most) credits of its viable courses, e.g. (0.25, 1)
+        for i, course in enumerate(self.sections):
+            if self.viable >> i & 1:
+                fewest, most = self.group_credits.get(course.group, (course.credits, course.credits))
+                self.group_credits[course.group] = (min(fewest, course.credits), max(most, course.credits))
 
-    def print_schedules(self, show_conflicting_schedules=False):
-        if show_conflicting_schedules:
+    def units_of(self, course):
+        """Returns the bitset of supplied sections that are the given course or a bundle containing it."""
+        bits = 0
+        for i, section in enumerate(self.sections):
+            if not self.removed >> i & 1 and (section is course or course in getattr(section, 'courses', ())):
+                bits |= 1 << i
+        if not bits and course in self.supplied_courses:
+            raise ValueError(f'{course} has no valid corequisite bundle: each section it must be taken with '
+                             f'conflicts with it or is ruled out by links')
+        if not bits:
+            raise ValueError(f'{course} is not a supplied course')
+        return bits
+
+    def add_section(self, course):
+        """Add a course to the supplied courses of a live AGS. Only the new sections are checked against
+        the others, and what was already searched stays cached for cached_schedules()."""
+        self.sync_sections(self.supplied_courses + [course])  # never the caller's list
+
+    def remove_section(self, course):
+        """Remove a course from the supplied courses of a live AGS (see add_section()). An exclude() or pin()
+        of it is kept, and applies again if it is added back."""
+        if course not in self.supplied_courses:
+            raise ValueError(f'{course} is not a supplied course')
+        self.sync_sections([supplied for supplied in self.supplied_courses if supplied is not course])
+
+    def sync_sections(self, supplied_courses):
+        """Make supplied_courses the supplied courses and bring self.sections up to date with them. Sections are
+        only ever appended, so every index and bitset stays valid: sections that are no longer supplied (including
+        bundles that a new corequisite replaces) are marked in self.removed, and new ones get their compatibility
+        bits. If bundle_corequisites() raises a ValueError, nothing is changed."""
+        units = bundle_corequisites(supplied_courses) if self.bundle else list(supplied_courses)
+        self.supplied_courses = supplied_courses
+        wanted = {tuple(getattr(unit, 'courses', [unit])): unit for unit in units}  # e.g. (lecture, lab) → bundle
+        existing = dict()
+        self.removed = 0
+        for i, section in enumerate(self.sections):
+            key = tuple(getattr(section, 'courses', [section]))
+            existing[key] = i
+            if key not in wanted:
+                self.removed |= 1 << i
+        for key, unit in wanted.items():
+            if key in existing:
+                continue
+            j = len(self.sections)
+            self.compatible.append(0)
+            for i, section in enumerate(self.sections):  # O(n) checks for each new section
+                if not unit.is_conflicting_with(section) and in_pool_order(unit, section):
+                    self.compatible[i] |= 1 << j
+                    self.compatible[j] |= 1 << i
+            self.sections.append(unit)
+            self.section_index[unit] = j
+        self.refresh()
+
+    def exclude(self, *courses):
+        """Rule out the given courses, e.g. exclude(lab_60), until include() is called for them."""
+        for course in courses:
+            self.units_of(course)  # raises a ValueError for a course that can't be searched
+        self.excluded_courses.update(courses)
+        self.refresh()
+
+    def include(self, *courses):
+        """Undo exclude() for the given courses. Sections with another excluded course stay ruled out."""
+        for course in courses:
+            self.units_of(course)
+        self.excluded_courses.difference_update(courses)
+        self.refresh()
+
+    def pin(self, *courses):
+        """Only allow schedules with the given courses, e.g. pin(lab_60) rules out every other lab 60
+        could have been replaced with, until unpin() is called."""
+        for course in courses:
+            self.units_of(course)
+        self.pinned_courses.update(courses)
+        self.refresh()
+
+    def unpin(self, *courses):
+        """Undo pin() for the given courses. Courses ruled out with exclude() stay ruled out."""
+        for course in courses:
+            self.units_of(course)
+        self.pinned_courses.difference_update(courses)
+        self.refresh()
+
+    def block_times(self, f_start, f_end, days):
+        """Leave out every section meeting in the given times, e.g. block_times('00:00', '10:00', 'MTWRF') for
+        no classes before 10:00. The sections are ruled out before the search, so the search gets faster."""
+        self.blocked |= time_mask(calc_minutes(f_start), calc_minutes(f_end), days, inclusive_end=False)
+        self.refresh()
+
+    def require_free_days(self, days):
+        """Leave out every section meeting on the given days, e.g. require_free_days('F') for Fridays off."""
+        self.block_times('00:00', '24:00', days)
+
+    def require_seats(self, min_seats=1):
+        """Leave out every section with fewer than min_seats unreserved seats. Unknown seats are allowed."""
+        self.min_seats = min_seats
+        self.refresh()
+
+    def limit_credits(self, low, high):
+        """Only allow schedules totalling low to high credits, e.g. limit_credits(3, 5). A partial schedule
+        is abandoned as soon as the fewest or most credits the remaining groups could add can't reach the range."""
+        self.credit_range = (low, high)
+
+    def clear_constraints(self):
+        """Undo block_times(), require_free_days(), require_seats(), and limit_credits()."""
+        self.blocked, self.min_seats, self.credit_range = 0, 0, None
+        self.refresh()
+
+    def credits_fit(self, credits, later_groups):
+        """Returns True unless a partial schedule with the given credits can't end up in self.credit_range,
+        whatever it gets from the given remaining groups (by name)."""
+        if self.credit_range is None:
+            return True
+        low, high = self.credit_range
+        fewest = sum(self.group_credits.get(group, (0, 0))[0] for group in later_groups)
+        most = sum(self.group_credits.get(group, (0, 0))[1] for group in later_groups)
+        return credits + fewest <= high and credits + most >= low
+
+    def print_schedules(self, show_conflicting_schedules=False, schedules=None, file=None):
+        """Print the generated schedules, or any iterable of schedules such as iter_schedules(), to file (by
+        default, stdout). Each schedule is printed as soon as it is produced, so a generator is never collected
+        into a list. See serializers.py for JSON and iCalendar output."""
+        if schedules is not None:
+            schedules_to_show = schedules  # e.g. a generator straight from the search
+        elif show_conflicting_schedules:
             schedules_to_show = self.schedules  # show all schedules if chosen
         else:
             schedules_to_show = self.non_conflicting_schedules  # else only show non-conflicting schedules
-        s = ""
-        for i in range(len(schedules_to_show)):
-            s += f"\nSchedule #{i + 1}:\n{schedules_to_show[i]}"
-        s += "\n"
-        print(s)
+        for i, schedule in enumerate(schedules_to_show):
+            with self.phase('output'):  # not the search producing the schedule, only printing it
+                print(f"\nSchedule #{i + 1}:\n{schedule}", end="", file=file)
+        print("\n", file=file)
 
     def add_schedule(self, schedule):
         self.schedules.append(schedule)  # always add schedule to schedules list
@@ -111,24 +714,433 @@ class AGS:
 
     def get_path(self):
         groups = dict()  # make a new dictionary to have group attributes as keys and lists of courses as values
-        for course in self.supplied_courses:
+        for i, course in enumerate(self.sections):  # courses and corequisite bundles
+            if self.removed >> i & 1:
+                continue  # no longer supplied
             if course.group in groups:
                 groups[course.group].append(course)
             else:
                 groups[course.group] = [course]
         return sorted(groups.values(), key=len)  # sort the lists by length from least to greatest
 
-    def build_schedules(self, groups_to_add, schedule=Schedule()):
+    def build_schedules(self, groups_to_add, schedule=None, show_conflicting_schedules=False):
+        """Add every schedule from generate_schedules() to the schedules lists."""
+        for finished_schedule in self.timed(self.generate_schedules(groups_to_add, schedule,
+                                                                    show_conflicting_schedules)):
+            self.add_schedule(finished_schedule)
+
+    def iter_schedule_classes(self, limit=None):
+        """Like iter_schedules(), but yield schedules of representatives without expanding them, so each
+        one stands for a whole class of interchangeable schedules (see expand_schedule())."""
+        return itertools.islice(self.generate_schedules(self.get_path(), expand=False), limit)
+
+    def expand_schedule(self, schedule):
+        """Yield every concrete schedule that a schedule of representatives stands for (see prepare()),
+        with corequisite bundles replaced by the courses in them."""
+        classes = [self.expansions[course] for course in schedule.courses]
+        for courses in itertools.product(*classes):
+            yield schedule.copy(list(itertools.chain.from_iterable(courses)))  # same times, so same mask
+
+    def unbundle_schedule(self, schedule):
+        """Returns a copy of the schedule where each corequisite bundle is replaced by the courses in it."""
+        return schedule.copy([course for unit in schedule.courses
+                              for course in (unit.courses if isinstance(unit, CorequisiteBundle) else [unit])])
+
+    def iter_schedules(self, limit=None, show_conflicting_schedules=False, workers=None):
+        """Lazily yield schedules along get_path() as the search finds them, without storing them.
+
+        With a limit, e.g. iter_schedules(limit=20), the search itself stops after the 20th schedule.
+        With workers, the search runs in that many processes (see parallel_schedules()).
+        """
+        if workers:
+            schedules = self.parallel_schedules(workers, show_conflicting_schedules)
+        else:
+            schedules = self.generate_schedules(self.get_path(), None, show_conflicting_schedules)
+        return self.timed(itertools.islice(schedules, limit))
+
+    def cached_schedules(self, limit=None):
+        """Like iter_schedules(), but every subtree searched is kept in self.subtrees, so after add_section(),
+        remove_section(), pin(), or exclude() only the subtrees the change reaches are searched again.
+
+        A subtree only depends on its depth, on which courses of the remaining groups are allowed, and on the
+        credits so far (only with a credit range), so it is stored under (depth, allowed, credits) as its list
+        of (course index, allowed after it, credits after it) branches that lead to a schedule. Only new
+        subtrees count towards num_recursions. The cache is started over if the group order of get_path() or
+        the credit range changes (e.g. a new course is added) or it grows past SUBTREE_CACHE_SIZE.
+        """
+        path_bits = [self.group_bits[group[0].group] for group in self.get_path()]
+        groups = tuple(self.sections[bits.bit_length() - 1].group for bits in path_bits)
+        if (groups, self.credit_range) != self.subtree_groups or len(self.subtrees) > SUBTREE_CACHE_SIZE:
+            self.subtrees = dict()
+            self.subtree_groups = (groups, self.credit_range)
+        remaining_bits = [0] * (len(path_bits) + 1)  # e.g. remaining_bits[2] covers groups 2, 3, ...
+        for depth in range(len(path_bits) - 1, -1, -1):
+            remaining_bits[depth] = remaining_bits[depth + 1] | path_bits[depth]
+        allowed = self.searchable & remaining_bits[0]
+        if path_bits:
+            self.explore_subtree(path_bits, remaining_bits, 0, allowed, 0)
+
+        def walk(depth, allowed, credits, ids):
+            if depth == len(path_bits):
+                if self.credits_fit(credits, []):  # only unchecked with no groups at all
+                    yield Schedule([self.sections[i] for i in ids])
+            else:
+                for i, next_allowed, next_credits in self.subtrees[depth, allowed, credits]:
+                    yield from walk(depth + 1, next_allowed, next_credits, ids + (i,))
+
+        classes = walk(0, allowed, 0, ())
+        return itertools.islice(itertools.chain.from_iterable(map(self.expand_schedule, classes)), limit)
+
+    def explore_subtree(self, path_bits, remaining_bits, depth, allowed, credits):
+        """Returns the branches below (depth, allowed, credits) for cached_schedules(), searching them only
+        if they aren't in self.subtrees yet."""
+        if (depth, allowed, credits) not in self.subtrees:
+            groups = self.subtree_groups[0]
+            self.num_recursions += 1
+            branches = []
+            candidates = allowed & path_bits[depth]
+            while candidates:  # the same candidates, in the same order, as generate_schedules()
+                lowest_bit = candidates & -candidates
+                candidates ^= lowest_bit
+                i = lowest_bit.bit_length() - 1
+                next_allowed = allowed & self.compatible[i] & remaining_bits[depth + 1]
+                next_credits = credits + self.sections[i].credits if self.credit_range else 0
+                if not self.credits_fit(next_credits, groups[depth + 1:]):
+                    continue
+                if depth + 1 == len(path_bits) or (all(next_allowed & bits for bits in path_bits[depth + 1:]) and
+                                                   self.explore_subtree(path_bits, remaining_bits, depth + 1,
+                                                                        next_allowed, next_credits)):
+                    branches.append((i, next_allowed, next_credits))
+            self.subtrees[depth, allowed, credits] = branches
+        return self.subtrees[depth, allowed, credits]
+
+    def count_schedules(self, estimate_cost=False):
+        """Returns how many non-conflicting schedules iter_schedules() would yield, without producing them.
+
+        Groups are split into independent parts, where no course of one part conflicts with any course of
+        another (e.g. MWF courses and TR courses), and the counts of the parts are multiplied. Within a part,
+        the count below a node only depends on the depth and on which courses of the remaining groups are
+        still allowed, so each such state is counted once and remembered (see count_along()).
+
+        With estimate_cost, returns (count, cost) instead, where cost is the number of generate_schedules()
+        calls the enumeration would make, i.e. the num_recursions it would add, e.g. (15, 20) for the demo.
+        """
+        path_bits = [self.group_bits[group[0].group] for group in self.get_path()]
+        count = 1
+        parts = self.independent_groups(path_bits) if self.credit_range is None else [path_bits]  # credits tie them
+        for part in parts:
+            count *= self.count_along(part)[0]
+            if not count:
+                break  # some part has no schedule, so neither does the whole
+        if estimate_cost:
+            return count, self.count_along(path_bits)[1]
+        return count
+
+    def independent_groups(self, path_bits):
+        """Given the group bitsets of a path, get them split into parts that share no conflicts, each part
+        in path order, e.g. [[MATH 201, PHYS 211], [ECON 101]] if ECON 101 fits around every section of both."""
+        part_of = list(range(len(path_bits)))  # union-find over group positions
+
+        def find(position):
+            while part_of[position] != position:
+                part_of[position] = part_of[part_of[position]]
+                position = part_of[position]
+            return position
+
+        for position, bits in enumerate(path_bits):
+            candidates = bits & self.searchable
+            while candidates:
+                lowest_bit = candidates & -candidates
+                candidates ^= lowest_bit
+                conflicting = ~self.compatible[lowest_bit.bit_length() - 1] & self.searchable
+                for other, other_bits in enumerate(path_bits[position + 1:], position + 1):
+                    if conflicting & other_bits:
+                        part_of[find(other)] = find(position)
+        parts = dict()
+        for position, bits in enumerate(path_bits):
+            parts.setdefault(find(position), []).append(bits)
+        return list(parts.values())
+
+    def count_along(self, path_bits):
+        """Returns (count, nodes) for a search through the groups with the given bitsets, in that order: the
+        number of concrete schedules, and the number of generate_schedules() calls it would take.
+
+        Each representative counts for every section it stands for, and results are memoized on
+        (depth, allowed & bits of the remaining groups, credits so far), since nothing else affects what lies
+        below. Credits are only tracked when there's a credit range, so they don't split the memo otherwise.
+        """
+        groups = [self.sections[bits.bit_length() - 1].group for bits in path_bits]
+        remaining_bits = [0] * (len(path_bits) + 1)  # e.g. remaining_bits[2] covers groups 2, 3, ...
+        for depth in range(len(path_bits) - 1, -1, -1):
+            remaining_bits[depth] = remaining_bits[depth + 1] | path_bits[depth]
+        weights = {self.section_index[course]: len(members) for course, members in self.equivalents.items()}
+        memo = dict()
+
+        def count_below(depth, allowed, credits):
+            if depth == len(path_bits):
+                return int(self.credits_fit(credits, [])), 1  # the finished schedule, and the call that reaches it
+            if (depth, allowed, credits) not in memo:
+                count, nodes = 0, 1
+                candidates = allowed & path_bits[depth]
+                while candidates:  # the same candidates, in the same order, as generate_schedules()
+                    lowest_bit = candidates & -candidates
+                    candidates ^= lowest_bit
+                    i = lowest_bit.bit_length() - 1
+                    next_allowed = allowed & self.compatible[i] & remaining_bits[depth + 1]
+                    if not all(next_allowed & bits for bits in path_bits[depth + 1:]):
+                        continue  # skipped by forward checking, so never visited
+                    next_credits = credits + self.sections[i].credits if self.credit_range else 0
+                    if not self.credits_fit(next_credits, groups[depth + 1:]):
+                        continue
+                    below_count, below_nodes = count_below(depth + 1, next_allowed, next_credits)
+                    count += weights[i] * below_count
+                    nodes += below_nodes
+                memo[depth, allowed, credits] = count, nodes
+            return memo[depth, allowed, credits]
+
+        return count_below(0, self.searchable & remaining_bits[0], 0)
+
+    def best_schedules(self, k, preferences=None, score=None, bound=None, workers=None):
+        """Returns the k lowest-scoring non-conflicting schedules as (score, schedule) pairs, best first.
+
+        preferences maps names from PREFERENCES to non-negative weights, e.g. {'gaps': 1, 'days_on_campus': 60},
+        and defaults to {'gaps': 1}. Alternatively, score is any function of a finished schedule, and
+        bound an optional function of a partial schedule that never exceeds the score of any completion.
+        Only the best k are kept (in a heap), and branches whose bound can't beat the k-th best are cut.
+        Ties go to the schedule found first.
+
+        With workers, the search is split across that many processes (see parallel_schedules()); this
+        needs preferences, since custom functions can't be sent to the workers.
+        """
+        preferences = preferences or {'gaps': 1}
+        if workers:
+            if score is not None:
+                raise ValueError('a parallel search can only rank by preferences, not by a custom score')
+            ranked = []
+            for task, results in enumerate(self.search_in_parallel(workers, k=k, preferences=preferences)):
+                ranked.extend((item_score, task, order, ids) for item_score, order, ids in results)
+            ranked.sort()  # by score, then by where the serial search would have found it
+            return [(item_score, self.unbundle_schedule(Schedule([self.sections[i] for i in ids])))
+                    for item_score, _, _, ids in ranked[:k]]
+        if score is None:
+            score, bound = preference_score(preferences)
+        with self.phase('search'):
+            ranked = self.rank_schedules(k, score, bound, self.get_path())
+        return [(item_score, schedule) for item_score, _, schedule in ranked]
+
+    def rank_schedules(self, k, score, bound, groups_to_add, schedule=None, allowed=None):
+        """Returns (score, order, schedule) triples for the best k schedules of generate_schedules(), best
+        first, where order counts the schedules in the order the search found them."""
+        best = []  # heap of (-score, -order, schedule), so its root is the worst of the best k so far
+        if k <= 0:
+            return []
+
+        def prune(partial_schedule):
+            return len(best) == k and bound(partial_schedule) >= -best[0][0]  # no completion can beat the k-th best
+
+        schedules = self.generate_schedules(groups_to_add, schedule, False, allowed,
+                                            prune if bound is not None else None)
+        for order, finished_schedule in enumerate(schedules):
+            item = (-score(finished_schedule), -order, finished_schedule)
+            if len(best) < k:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)  # it beats the current k-th best, which drops out
+        return [(-negative_score, -negative_order, finished_schedule)
+                for negative_score, negative_order, finished_schedule in sorted(best, reverse=True)]
+
+    def parallel_schedules(self, workers, show_conflicting_schedules=False):
+        """Yield the same schedules as iter_schedules(), in the same order, but search with a pool of worker
+        processes. The tree is split on the first one or two groups of get_path(), each subtree becomes a
+        task, and the workers send back tuples of section ids that are turned back into schedules here."""
+        for results in self.search_in_parallel(workers, show_conflicting_schedules):
+            for ids in results:
+                yield self.unbundle_schedule(Schedule([self.sections[i] for i in ids]))
+
+    def search_in_parallel(self, workers, show_conflicting_schedules=False, k=None, preferences=None):
+        """Yield the results of search_subtree() for each task, in task order, counting the nodes visited."""
+        path = [[self.section_index[course] for course in group] for group in self.get_path()]
+        if not path:
+            self.num_recursions += 1
+            if self.credits_fit(0, []):
+                yield [()] if k is None else [(0, 0, ())]  # the empty schedule, just like the serial search
+            return
+        depth = 1 if len(path) == 1 or len(path[0]) >= 2 * workers else 2  # enough tasks to keep every worker busy
+        all_groups = [self.sections[group[0]].group for group in path]
+        all_group_bits = [self.group_bits[group] for group in all_groups]
+        prefixes = [((), self.searchable, 0)]  # (section ids, allowed, credits)
+        for depth_reached, group in enumerate(path[:depth]):
+            self.num_recursions += len(prefixes)  # the serial search visits these nodes above the tasks
+            later_groups = all_groups[depth_reached + 1:]
+            if show_conflicting_schedules:
+                prefixes = [(prefix + (i,), allowed, credits + self.sections[i].credits)
+                            for prefix, allowed, credits in prefixes for i in group
+                            if not (self.excluded | self.unsuitable) >> i & 1 and
+                            all(in_pool_order(self.sections[i], self.sections[j]) for j in prefix) and
+                            self.credits_fit(credits + self.sections[i].credits, later_groups)]
+            else:  # the same candidates, in the same order, as generate_schedules() would try
+                prefixes = [(prefix + (i,), allowed & self.compatible[i], credits + self.sections[i].credits)
+                            for prefix, allowed, credits in prefixes for i in group
+                            if allowed >> i & 1 and all(allowed & self.compatible[i] & bits
+                                                        for bits in all_group_bits[depth_reached + 1:]) and
+                            self.credits_fit(credits + self.sections[i].credits, later_groups)]
+        executor = ProcessPoolExecutor(workers, initializer=start_worker,
+                                       initargs=(compact_sections(self.sections), self.compatible, path,
+                                                 self.removed, self.excluded | self.unsuitable, self.credit_range))
+        try:
+            tasks = executor.map(search_subtree, [prefix for prefix, _, _ in prefixes],
+                                 itertools.repeat(show_conflicting_schedules), itertools.repeat(k),
+                                 itertools.repeat(preferences))
+            for num_recursions, results in tasks:
+                self.num_recursions += num_recursions
+                yield results
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def generate_schedules(self, groups_to_add, schedule=None, show_conflicting_schedules=False, allowed=None,
+                           prune=None, expand=True):
+        """Recursively add one course from each group to the schedule, smallest group first, and yield
+        each finished schedule as soon as it is reached.
+
+        Unless show_conflicting_schedules is True, a branch is abandoned as soon as the course just
+        added conflicts with the partial schedule, so only non-conflicting schedules are produced.
+        Conflicts are looked up in the bitsets from prepare(): allowed has a bit set for every course
+        still compatible with the whole partial schedule, and it defaults to self.searchable, so only
+        representatives of interchangeable sections are tried. Only the allowed courses of each group
+        are visited, in index order, and a course is skipped when it would leave a later group with no
+        allowed course at all, or when no completion could total self.credit_range (see credits_fit()).
+        Each finished schedule of representatives is expanded into the concrete schedules it stands for
+        unless expand is False. prune is an optional function of the partial schedule; when it returns True
+        the branch is abandoned too.
+
+        A single partial schedule is shared by the whole search: courses are added on the way down and
+        popped on the way back up, and a copy is only made when a finished schedule is yielded.
+        """
+        if schedule is None:
+            schedule = Schedule()  # a fresh partial schedule per search, never one shared between calls
+        if allowed is None:
+            allowed = self.searchable
         self.num_recursions += 1  # increment the number of times this function has been called
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchCancelled()  # e.g. nobody is waiting for the result any more
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+            stats.peak_depth = max(stats.peak_depth, len(schedule.courses))
 
         if not groups_to_add:  # when all groups have been added
-            self.add_schedule(schedule)  # add the finished schedule to schedules list
+            if not self.credits_fit(schedule.credits, []):
+                return  # e.g. with no groups at all, no course was ever checked against self.credit_range
+            if stats is not None:
+                stats.schedule_copies += 1 if not expand or show_conflicting_schedules else \
+                    math.prod(len(self.expansions[course]) for course in schedule.courses)
+            if not expand:
+                yield schedule.copy()  # hand out a snapshot of the finished schedule
+            elif show_conflicting_schedules:
+                yield self.unbundle_schedule(schedule)  # every section was tried, so there's nothing to expand
+            else:
+                yield from self.expand_schedule(schedule)  # hand out everything it stands for
+        elif show_conflicting_schedules:
+            later_groups = [group[0].group for group in groups_to_add[1:]]
+            for course in groups_to_add[0]:  # every combination is wanted, so nothing is ruled out
+                if (self.excluded | self.unsuitable) >> self.section_index[course] & 1:
+                    continue  # except by the user or by constraints
+                if not all(in_pool_order(course, other) for other in schedule.courses):
+                    continue  # or by the order of a pool's picks, which is not a conflict
+                if not self.credits_fit(schedule.credits + course.credits, later_groups):
+                    if stats is not None:
+                        stats.prune(len(schedule.courses))
+                    continue
+                schedule.add_course(course)
+                if prune is None or not prune(schedule):
+                    yield from self.generate_schedules(groups_to_add[1:], schedule, True, allowed, prune, expand)
+                elif stats is not None:
+                    stats.prune(len(schedule.courses) - 1)
+                schedule.pop_course()
         else:
-            next_group_to_add = groups_to_add[0]  # list of courses with same group attribute
-            for course in next_group_to_add:  # recurse on each possibility from this same-group list
-                local_schedule = copy.deepcopy(schedule)  # make a completely separate schedule object
-                local_schedule.add_course(course)  # add it to the schedule
-                self.build_schedules(groups_to_add[1:], local_schedule)  # with the group taken care of, proceed
+            later_groups = [group[0].group for group in groups_to_add[1:]]
+            later_group_bits = [self.group_bits[group] for group in later_groups]
+            candidates = allowed & self.group_bits[groups_to_add[0][0].group]  # the group's allowed courses
+            if stats is not None:
+                stats.conflict_checks += bin(candidates).count('1')  # each is checked against the schedule below
+            while candidates:  # recurse on each possibility from this same-group list
+                lowest_bit = candidates & -candidates
+                candidates ^= lowest_bit
+                i = lowest_bit.bit_length() - 1  # e.g. 0b1000 is the course with index 3
+                next_allowed = allowed & self.compatible[i]  # what is still compatible after adding it
+                if not all(next_allowed & bits for bits in later_group_bits) or \
+                        not self.credits_fit(schedule.credits + self.sections[i].credits, later_groups):
+                    if stats is not None:
+                        stats.prune(len(schedule.courses))
+                    continue  # some later group has nothing left that fits, or the credits can't work out
+                schedule.add_course(self.sections[i])  # add it to the shared partial schedule
+                if prune is None or not prune(schedule):
+                    yield from self.generate_schedules(groups_to_add[1:], schedule, False, next_allowed, prune,
+                                                       expand)  # with the group taken care of, proceed
+                elif stats is not None:
+                    stats.prune(len(schedule.courses) - 1)
+                schedule.pop_course()  # undo the addition before trying the next course in this group
+
+
+"""
+PARALLEL SEARCH
+"""
+
+worker_ags = None  # each worker process's own AGS, built once by start_worker()
+worker_path = None  # get_path() as lists of section ids, shared by every task in the worker
+
+
+def compact_sections(sections):
+    """Given courses, get just what a worker needs to search them: groups, names, meeting times, credits, and
+    pools."""
+    return [(course.group, course.name, course.time_blocks, course.inclusive_end, course.credits, course.pool,
+             course.slot) for course in sections]
+
+
+def start_worker(compact, compatible, path, removed=0, excluded=0, credit_range=None):
+    """Set up a worker process from compact_sections(), the compatibility bitsets, the path of ids, the
+    parent's removed sections, the sections it ruled out (by exclusion or constraint), and its credit range.
+    The worker's stand-in courses use their section id as their CRN."""
+    global worker_ags, worker_path
+    sections = []
+    for i, (group, name, time_blocks, inclusive_end, credits, pool, slot) in enumerate(compact):
+        (days, start, end), *other_blocks = time_blocks
+        course = Course('', '', '', format_minutes(start), format_minutes(end), days, i, inclusive_end,
+                        credits=credits)
+        for days, start, end in other_blocks:
+            course.add_time_block(format_minutes(start), format_minutes(end), days)
+        course.group = group
+        course.name = name  # so that the worker finds the same interchangeable sections as the parent
+        course.pool, course.slot = pool, slot
+        sections.append(course)
+    worker_ags = AGS(sections, compatible, bundle=False)  # the parent's sections are already bundled
+    worker_ags.removed, worker_ags.excluded, worker_ags.credit_range = removed, excluded, credit_range
+    worker_ags.refresh()
+    worker_path = path
+
+
+def search_subtree(prefix, show_conflicting_schedules=False, k=None, preferences=None):
+    """Search the subtree below prefix (section ids from the first groups of the path) in a worker.
+
+    Returns the number of nodes visited and the results in search order: tuples of section ids, or with k,
+    (score, order, ids) triples for the subtree's best k by preferences.
+    """
+    schedule = Schedule()
+    allowed = worker_ags.searchable
+    for i in prefix:
+        schedule.add_course(worker_ags.sections[i])
+        allowed &= worker_ags.compatible[i]
+    groups_to_add = [[worker_ags.sections[i] for i in group] for group in worker_path[len(prefix):]]
+    worker_ags.num_recursions = 0
+    if k is None:
+        schedules = worker_ags.generate_schedules(groups_to_add, schedule, show_conflicting_schedules, allowed)
+        results = [tuple(course.crn for course in finished_schedule.courses) for finished_schedule in schedules]
+    else:
+        score, bound = preference_score(preferences)
+        ranked = worker_ags.rank_schedules(k, score, bound, groups_to_add, schedule, allowed)
+        results = [(item_score, order, tuple(course.crn for course in finished_schedule.courses))
+                   for item_score, order, finished_schedule in ranked]
+    return worker_ags.num_recursions, results
 
 
 """
@@ -136,16 +1148,143 @@ TESTS
 """
 
 
-def test_ags(courses):
+def test_ags(courses, show_conflicting_schedules=False):
     print("▒" * 64)
     print(f"Now testing: AGS...")
     ags = AGS(courses)
-    ags.build_schedules(ags.get_path())
-    ags.print_schedules()
-    print(f"build_schedules() was called {ags.num_recursions} times.")
+    ags.build_schedules(ags.get_path(), show_conflicting_schedules=show_conflicting_schedules)
+    ags.print_schedules(show_conflicting_schedules)
+    print(f"prepare() removed {ags.num_removed_sections} sections that fit no schedule.")
+    print(f"generate_schedules() was called {ags.num_recursions} times.")
     return ags.schedules
 
 
+def schedule_crns(schedules):
+    """Given schedules, get their CRNs in a form that doesn't depend on the order they were found in."""
+    return sorted(tuple(sorted(course.crn for course in schedule.courses)) for schedule in schedules)
+
+
+def test_incremental(courses):
+    """Check cached_schedules() after each incremental change against a fresh AGS of the courses it leaves."""
+    print("▒" * 64)
+    print(f"Now testing: cached_schedules() after add_section(), remove_section(), exclude(), and pin()...")
+    ags = AGS(courses)
+
+    def check(change, expected_courses, group_emptied=False):
+        """group_emptied means a whole group is ruled out (not removed), so there are no schedules at all."""
+        cached = schedule_crns(ags.cached_schedules())
+        expected = [] if group_emptied else schedule_crns(AGS(expected_courses).iter_schedules())
+        assert cached == expected, change
+        print(f"{change}: {len(cached)} schedules, as expected.")
+
+    check('before any change', courses)
+    for course in courses:
+        ags.remove_section(course)
+        check(f'remove_section({course.name}-{course.section})', [other for other in courses if other is not course])
+        ags.add_section(course)
+        check(f'add_section({course.name}-{course.section})', [other for other in courses if other is not course]
+              + [course])
+        ags.exclude(course)
+        others = [other for other in courses if other is not course]
+        check(f'exclude({course.name}-{course.section})', others,
+              not any(other.group == course.group for other in others))
+        ags.include(course)
+        ags.pin(course)
+        check(f'pin({course.name}-{course.section})',
+              [other for other in courses if other.name != course.name or other is course])
+        ags.unpin(course)
+
+    lectures = [course for course in courses if course.name == 'CSCI 206']
+    labs = [course for course in courses if course.name == 'CSCI 206L']
+    without = [course for course in courses if course is not lectures[0]]  # e.g. after exclude(lectures[0])
+    ags = AGS(courses)  # each sequence starts and ends with every course allowed
+    ags.exclude(lectures[0])
+    ags.exclude(labs[0])
+    ags.include(labs[0])
+    check('exclude(lecture), exclude(lab), include(lab)', without)
+    ags.remove_section(labs[1])
+    ags.add_section(labs[1])
+    check('exclude(lecture), remove_section(lab), add_section(lab)', without)
+    for lab in labs:
+        ags.remove_section(lab)
+    check('exclude(lecture), remove_section() of every lab', [course for course in without if course not in labs])
+    for lab in labs:
+        ags.add_section(lab)
+    ags.include(lectures[0])
+    check('add_section() of every lab, include(lecture)', courses)
+    ags.exclude(labs[0])
+    ags.pin(labs[1])
+    ags.unpin(labs[1])
+    check('exclude(lab), pin(other lab), unpin(other lab)', [course for course in courses if course is not labs[0]])
+    ags.pin(lectures[1], labs[2])
+    ags.unpin(labs[2])
+    check('pin(lecture, lab), unpin(lab)', [course for course in courses
+                                            if course is not labs[0] and course not in lectures[::2]])
+    ags.unpin(lectures[1])
+    ags.include(labs[0])
+    check('unpin(lecture), include(lab)', courses)
+
+    lecture = Course('CSCI', '206', '09', '08:00', '15:00', 'T', '59999')  # conflicts with every lab of CSCI 206L
+    ags.add_section(lecture)
+    try:
+        ags.pin(lecture)
+        raise AssertionError('pin() accepted a lecture without a valid corequisite bundle')
+    except ValueError as error:
+        assert 'no valid corequisite bundle' in str(error), error
+        print(f"pin() of a lecture that conflicts with every lab: {error}")
+
+
+def test_missing_bundle():
+    """A required lecture that fits none of its labs is an error, not a schedule without the lecture."""
+    print("▒" * 64)
+    print(f"Now testing: a required lecture without a valid corequisite bundle...")
+    lecture = Course('CSCI', '206', '01', '09:00', '09:50', 'MWF', '1')
+    lab = Course('CSCI', '206L', '60', '09:00', '10:50', 'M', '2')  # conflicts with the only lecture
+    other = Course('RESC', '221', '06', '17:00', '18:30', 'W', '3')
+    assert not list(AGS([lecture, lab, other], bundle=False).iter_schedules())
+    try:
+        AGS([lecture, lab, other])
+        raise AssertionError('AGS() searched without the lecture')
+    except ValueError as error:
+        assert 'no valid corequisite bundle' in str(error), error
+        print(f"AGS(): {error}")
+    ags = AGS([lecture, other])
+    try:
+        ags.add_section(lab)
+        raise AssertionError('add_section() searched without the lecture')
+    except ValueError as error:
+        assert ags.supplied_courses == [lecture, other], ags.supplied_courses
+        assert schedule_crns(ags.cached_schedules()) == [('1', '3')], 'add_section() changed the search'
+        print(f"add_section() left the search as it was: {error}")
+
+
+def test_count_schedules(courses):
+    """Check count_schedules(estimate_cost=True) against enumerating the schedules, for the courses and for
+    the courses with each one left out."""
+    print("▒" * 64)
+    print(f"Now testing: count_schedules(estimate_cost=True)...")
+    for i in range(len(courses) + 1):
+        subset = courses[:i] + courses[i + 1:]  # e.g. every course when i == len(courses)
+        ags = AGS(subset)
+        num_schedules = sum(1 for _ in ags.iter_schedules())
+        assert AGS(subset).count_schedules(estimate_cost=True) == (num_schedules, ags.num_recursions), i
+    print(f"count_schedules() matched the enumeration for {len(courses) + 1} sets of courses.")
+
+
+def test_parallel(courses, workers=2):
+    """Check iter_schedules(workers=...) against a fresh serial AGS, with and without conflicting schedules."""
+    print("▒" * 64)
+    print(f"Now testing: iter_schedules(workers={workers})...")
+    for show_conflicting_schedules in (False, True):
+        serial = [schedule.courses for schedule in AGS(courses).iter_schedules(
+            show_conflicting_schedules=show_conflicting_schedules)]
+        parallel = [schedule.courses for schedule in AGS(courses).iter_schedules(
+            show_conflicting_schedules=show_conflicting_schedules, workers=workers)]
+        assert [[course.crn for course in schedule] for schedule in parallel] == \
+               [[course.crn for course in schedule] for schedule in serial], show_conflicting_schedules
+        print(f"show_conflicting_schedules={show_conflicting_schedules}: {len(parallel)} schedules, in serial order.")
+
+
 def test_calc_minutes():
     print("▒" * 64)
     print(f"Now testing: calc_minutes()")
@@ -169,9 +1308,9 @@ if __name__ == "__main__":
         Course('CSCI', '206', '01', '09:00', '09:50', 'MWF', '50120'),
         Course('CSCI', '206', '02', '11:00', '11:50', 'MWF', '50536'),
         Course('CSCI', '206', '03', '13:00', '13:50', 'MWF', '54958'),
-        # Course('CSCI', '206L', '60', '08:00', '09:50', 'T', '50175'),
-        # Course('CSCI', '206L', '61', '10:00', '11:50', 'T', '50447'),
-        # Course('CSCI', '206L', '62', '13:00', '14:50', 'T', '54025'),
+        Course('CSCI', '206L', '60', '08:00', '09:50', 'T', '50175'),
+        Course('CSCI', '206L', '61', '10:00', '11:50', 'T', '50447'),
+        Course('CSCI', '206L', '62', '13:00', '14:50', 'T', '54025'),
         # Elective('ARST', '245', '01', '10:00', '11:50', 'MW', 1, '52954'),
         # Elective('ARST', '131', '03', '13:00', '14:50', 'MW', 1, '54547'),
         # Elective('ARST', '239', '01', '10:00', '11:50', 'TR', 1, '51345'),
@@ -184,3 +1323,7 @@ if __name__ == "__main__":
         Course('RESC', '221', '06', '17:00', '18:30', 'W', '54690')
     ]
     ags_output = test_ags(johns_courses)
+    test_incremental(johns_courses)
+    test_missing_bundle()
+    test_count_schedules(johns_courses)
+    test_parallel(johns_courses)
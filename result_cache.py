@@ -0,0 +1,153 @@
+import hashlib
+import json
+import shelve
+import sys
+from collections import OrderedDict
+
+from catalog import load_catalog
+from main import AGS, Schedule
+
+"""
+RESULT CACHE
+"""
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # e.g. 64 MiB of cached results in memory
+
+
+def course_key(course):
+    """Given a course, get everything about it that a search depends on, e.g. ['50537', 'CSCI 205', 'CSCI 205',
+    '01', [['MWF', 540, 590]], True, [], None, 0], so hand-built courses with the same (or no) CRN only share a key
+    when they would give the same schedules."""
+    return [course.crn, course.group, course.name, course.section, [list(block) for block in course.time_blocks],
+            course.inclusive_end, sorted([link.crn, link.name, link.section] for link in course.links), course.pool,
+            course.slot]
+
+
+def canonical_courses(courses):
+    """Given courses, get them in canonical order: by course_key(), i.e. by CRN, then by group (the same section
+    can be required in one request and an elective in another), then by everything else."""
+    return sorted(courses, key=lambda course: json.dumps(course_key(course)))
+
+
+def request_key(courses, options=None, catalog_version=''):
+    """Given the courses of a request, its search options, and the version of the catalog they came from
+    (see Catalog.version), get a key that is the same for every request with the same courses in any order."""
+    request = {
+        'courses': [course_key(course) for course in canonical_courses(courses)],
+        'options': sorted((options or dict()).items()),
+        'catalog': catalog_version,
+    }
+    return hashlib.sha256(json.dumps(request).encode('utf-8')).hexdigest()
+
+
+def results_size(results):
+    """Approximate memory used by a list of tuples of small ints, in bytes."""
+    return sys.getsizeof(results) + sum(sys.getsizeof(ids) for ids in results)
+
+
+class ResultCache:
+    """Search results by request_key(), least recently used first, in at most max_bytes of memory, and
+    optionally in a shelve file at path that survives restarts.
+
+    Each result is stored as a list of tuples of indices into the request's canonical_courses(), not as
+    Schedule objects, so an entry is small and means the same thing to every request with that key.
+
+    Attributes:
+    hits (int) -- requests answered from the cache, in memory or on disk.
+    disk_hits (int) -- the hits that had to be read back from disk.
+    misses (int) -- requests that ran a search.
+    evictions (int) -- entries dropped from memory to stay within max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key → results, least recently used first
+        self.sizes = dict()  # key → results_size() of its results
+        self.num_bytes = 0  # the total of self.sizes
+        self.store = shelve.open(path) if path else None
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def get(self, key):
+        """Returns the cached results for a key, or None, counting a hit or a miss."""
+        if key in self.entries:
+            self.entries.move_to_end(key)  # now the most recently used
+            self.hits += 1
+            return self.entries[key]
+        if self.store is not None and key in self.store:
+            results = self.store[key]
+            self.remember(key, results)
+            self.hits += 1
+            self.disk_hits += 1
+            return results
+        self.misses += 1
+        return None
+
+    def put(self, key, results):
+        """Cache the results for a key, in memory and on disk if there's a store."""
+        if self.store is not None:
+            self.store[key] = results
+        self.remember(key, results)
+
+    def remember(self, key, results):
+        """Keep results in memory, evicting the least recently used entries until they fit."""
+        if key in self.entries:
+            self.num_bytes -= self.sizes.pop(key)
+            del self.entries[key]
+        size = results_size(results)
+        if size > self.max_bytes:
+            return  # it would push out everything else, so it is only kept on disk (if at all)
+        while self.num_bytes + size > self.max_bytes:
+            evicted_key, _ = self.entries.popitem(last=False)
+            self.num_bytes -= self.sizes.pop(evicted_key)
+            self.evictions += 1
+        self.entries[key] = results
+        self.sizes[key] = size
+        self.num_bytes += size
+
+    def stats(self):
+        """Returns the counters, plus how many entries and bytes are held in memory."""
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.num_bytes}
+
+    def get_schedules(self, courses, limit=None, show_conflicting_schedules=False, catalog_version=''):
+        """Returns the schedules of AGS(courses).iter_schedules(limit, show_conflicting_schedules), searching
+        only if the request isn't cached. The search always runs on canonical_courses(), so the schedules
+        and their order don't depend on the order courses were given in, or on whether the cache was hit."""
+        courses = canonical_courses(courses)
+        options = {'limit': limit, 'show_conflicting_schedules': show_conflicting_schedules}
+        key = request_key(courses, options, catalog_version)
+        results = self.get(key)
+        if results is None:
+            index = {course: i for i, course in enumerate(courses)}
+            schedules = AGS(courses).iter_schedules(limit, show_conflicting_schedules)
+            results = [tuple(index[course] for course in schedule.courses) for schedule in schedules]
+            self.put(key, results)
+        return [Schedule.from_courses([courses[i] for i in ids]) for ids in results]  # no history to keep
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    catalog = load_catalog()
+    cache = ResultCache()
+    for names in [('CSCI 205', 'CSCI 206', 'CSCI 206L', 'RESC 221'), ('RESC 221', 'CSCI 206L', 'CSCI 206', 'CSCI 205')]:
+        schedules = cache.get_schedules(catalog.get_sections(*names), catalog_version=catalog.version)
+        print(f"{' + '.join(names)}: {len(schedules)} schedules")
+    print(cache.stats())
@@ -0,0 +1,137 @@
+import bisect
+import sys
+from array import array
+
+from main import Schedule
+
+"""
+SCHEDULE STORE
+"""
+
+PAGE_SIZE = 20  # schedules per page, by default
+
+
+class ScheduleStore:
+    """A compact list of schedules: each schedule is a row of small ints indexing one shared section table,
+    and every row is packed end to end in one array, so a schedule costs a few bytes per course instead of a
+    Schedule object, a list, and their headers. Schedule objects are only built for the rows being viewed.
+
+    Indexing is O(1) and returns a Schedule; slicing returns a ScheduleStore of those rows, sharing the table.
+
+    Attributes:
+    sections (list) -- the section table: every distinct course in the stored schedules.
+    ids (array) -- every row's section table indices, one row after another.
+    offsets (array) -- row i is ids[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, schedules=(), sections=None):
+        self.sections = sections if sections is not None else []
+        self.section_index = {course: i for i, course in enumerate(self.sections)}  # course → index in the table
+        self.ids = array('H' if len(self.sections) <= 0xFFFF else 'I')  # 2 bytes per course while they fit
+        self.offsets = array('Q', [0])
+        self.extend(schedules)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        """Lazily yield every schedule, e.g. to print or serialize them without materializing all at once."""
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.select(range(len(self))[key])
+        return Schedule.from_courses([self.sections[i] for i in self.row(key)])  # no history to keep
+
+    def append(self, schedule):
+        for course in schedule.courses:
+            if course not in self.section_index:
+                self.section_index[course] = len(self.sections)
+                self.sections.append(course)
+                if len(self.sections) == 0x10000 and self.ids.typecode == 'H':
+                    self.ids = array('I', self.ids)  # more sections than 2 bytes can index
+            self.ids.append(self.section_index[course])
+        self.offsets.append(len(self.ids))
+
+    def extend(self, schedules):
+        """Append every schedule of an iterable, e.g. AGS.iter_schedules(), one at a time as it is produced."""
+        for schedule in schedules:
+            self.append(schedule)
+
+    def row(self, i):
+        """Returns schedule i as an array of section table indices, without building a Schedule."""
+        i = range(len(self))[i]  # e.g. -1 for the last, and an IndexError when out of range
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def crns(self, i):
+        """Returns schedule i's CRNs, e.g. ('50537', '50120', '50175')."""
+        return tuple(self.sections[section_id].crn for section_id in self.row(i))
+
+    def select(self, rows):
+        """Returns a ScheduleStore of the given rows (indices into this store, in order), sharing the table."""
+        store = ScheduleStore(sections=self.sections)
+        store.section_index = self.section_index
+        store.ids = array(self.ids.typecode)
+        for i in rows:
+            store.ids.extend(self.ids[self.offsets[i]:self.offsets[i + 1]])
+            store.offsets.append(len(store.ids))
+        return store
+
+    def containing(self, crn):
+        """Returns a ScheduleStore of the schedules with a section of the given CRN, e.g. '50537'. Each
+        matching index is found with array.index(), so rows without it are skipped at C speed."""
+        rows = set()
+        for section_id in (i for i, course in enumerate(self.sections) if course.crn == crn):
+            position = 0
+            while True:
+                try:
+                    position = self.ids.index(section_id, position)
+                except ValueError:
+                    break
+                i = bisect.bisect_right(self.offsets, position) - 1  # the row the position falls in
+                rows.add(i)
+                position = self.offsets[i + 1]
+        return self.select(sorted(rows))
+
+    def num_pages(self, page_size=PAGE_SIZE):
+        return -(-len(self) // page_size)
+
+    def page(self, number, page_size=PAGE_SIZE):
+        """Returns the Schedule objects of a page, numbered from 0, e.g. page(0) is the first PAGE_SIZE."""
+        return list(self[number * page_size:(number + 1) * page_size])
+
+    def nbytes(self):
+        """Memory used by the rows, in bytes (the section table's courses are shared with the search)."""
+        return sys.getsizeof(self.ids) + sys.getsizeof(self.offsets) + sys.getsizeof(self.sections)
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    from catalog import load_catalog
+    from main import AGS
+
+    catalog = load_catalog()
+    ags = AGS(catalog.get_sections('MATH 201', 'ECON 101')
+              + catalog.get_electives(1, 'PSYC 100', 'POLS 170', 'EDUC 102')
+              + catalog.get_electives(2, 'WMST 150', 'ENLS 101', 'PHIL 100')
+              + catalog.get_electives(3, 'POLS 140', 'CSCI 203'))
+    tracemalloc.start()
+    schedules = list(ags.iter_schedules())
+    print(f"{len(schedules)} Schedule objects: {tracemalloc.get_traced_memory()[0] / 1024:.0f} KiB")
+    tracemalloc.stop()
+    del schedules
+    store = ScheduleStore(ags.iter_schedules())
+    print(f"{len(store)} stored schedules: {store.nbytes() / 1024:.0f} KiB for {len(store.sections)} sections")
+    crn = store.crns(len(store) // 2)[0]
+    start = time.perf_counter()
+    matching = store.containing(crn)
+    print(f"{len(matching)} schedules contain {crn} ({(time.perf_counter() - start) * 1000:.2f} ms), "
+          f"{matching.num_pages()} pages; the first one:")
+    ags.print_schedules(schedules=matching.page(0)[:2])
@@ -0,0 +1,146 @@
+import datetime
+import json
+import sys
+
+from main import AGS, DAYS, format_minutes
+
+"""
+SCHEDULE SERIALIZERS
+"""
+
+ICAL_DAYS = dict(zip(DAYS, ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']))  # e.g. 'R' → 'TH'
+ICAL_LINE_OCTETS = 75  # longer content lines are folded onto continuation lines
+TERM_WEEKS = 14  # how many weeks a calendar's classes repeat for, by default
+
+
+def course_record(course):
+    """Given a course, get it as a JSON-ready dict, e.g. {'crn': '50537', 'name': 'CSCI 205', 'section': '01',
+    'title': 'Software Engineering', 'group': 'CSCI 205', 'credits': 1, 'seats': 12,
+    'blocks': [['MWF', '09:00', '09:50']]}."""
+    return {'crn': course.crn, 'name': course.name, 'section': course.section, 'title': course.title,
+            'group': course.group, 'credits': course.credits, 'seats': course.seats,
+            'blocks': [[days, format_minutes(start), format_minutes(end)] for days, start, end in course.time_blocks]}
+
+
+def write_ndjson(schedules, file):
+    """Write each schedule as one line of JSON as soon as it is produced, e.g. {"schedule": 1, "credits": 2,
+    "has_conflict": false, "courses": [course_record(), ...]}, and return how many were written."""
+    num_schedules = 0
+    for num_schedules, schedule in enumerate(schedules, 1):
+        file.write(json.dumps({'schedule': num_schedules, 'credits': schedule.credits,
+                               'has_conflict': schedule.has_conflict,
+                               'courses': [course_record(course) for course in schedule.courses]}))
+        file.write('\n')
+    return num_schedules
+
+
+def write_compact_json(schedules, file):
+    """Write the schedules as one JSON object, {"schedules": [[0, 2], [1, 2], ...], "sections": [course_record(),
+    ...]}, where each schedule is the indices of its courses in the section table, and return how many were
+    written. Schedules are written as they are produced, and the table (which only grows with the number of
+    distinct sections, not schedules) comes last."""
+    section_ids = dict()  # course → its index in the section table
+    file.write('{"schedules": [')
+    num_schedules = 0
+    for num_schedules, schedule in enumerate(schedules, 1):
+        ids = [section_ids.setdefault(course, len(section_ids)) for course in schedule.courses]
+        file.write(f"{', ' if num_schedules > 1 else ''}{json.dumps(ids)}")
+    file.write('], "sections": [')
+    file.write(', '.join(json.dumps(course_record(course)) for course in section_ids))
+    file.write(']}\n')
+    return num_schedules
+
+
+def ical_text(text):
+    """Escape text for an iCalendar property value, e.g. 'Art, Music; Dance' → 'Art\\, Music\\; Dance'."""
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def write_ical_line(file, line):
+    """Write a content line, folded so no line is longer than ICAL_LINE_OCTETS octets of UTF-8."""
+    encoded = line.encode('utf-8')
+    while len(encoded) > ICAL_LINE_OCTETS:
+        cut = ICAL_LINE_OCTETS
+        while encoded[cut] & 0xC0 == 0x80:  # never split a multi-byte character
+            cut -= 1
+        file.write(encoded[:cut].decode('utf-8') + '\r\n')
+        encoded = b' ' + encoded[cut:]  # a continuation line starts with a space
+    file.write(encoded.decode('utf-8') + '\r\n')
+
+
+def write_ics(schedules, file, term_start, weeks=TERM_WEEKS, stamp=None):
+    """Write each schedule as an iCalendar object (one VCALENDAR per schedule, one after another, as RFC 5545
+    allows in a stream), with a weekly recurring event per meeting time from the week of term_start (a date)
+    for the given number of weeks, and return how many were written. The times are floating local times.
+    Lines end in CRLF as RFC 5545 requires, so open files with newline=''."""
+    stamp = (stamp or datetime.datetime.now(datetime.timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+    until = (term_start + datetime.timedelta(weeks=weeks, days=-1)).strftime('%Y%m%dT235959')
+    num_schedules = 0
+    for num_schedules, schedule in enumerate(schedules, 1):
+        write_ical_line(file, 'BEGIN:VCALENDAR')
+        write_ical_line(file, 'VERSION:2.0')
+        write_ical_line(file, 'PRODID:-//a-good-scheduler//schedules//EN')
+        write_ical_line(file, f'X-WR-CALNAME:Schedule #{num_schedules}')
+        for course in schedule.courses:
+            for block_num, (days, start, end) in enumerate(course.time_blocks):
+                first_day = min(term_start + datetime.timedelta(days=(DAYS.index(day) - term_start.weekday()) % 7)
+                                for day in days)  # the block's first meeting on or after term_start
+                write_ical_line(file, 'BEGIN:VEVENT')
+                write_ical_line(file, f'UID:{course.crn}-{block_num}-{num_schedules}@a-good-scheduler')
+                write_ical_line(file, f'DTSTAMP:{stamp}')
+                write_ical_line(file, f"DTSTART:{first_day:%Y%m%d}T{format_minutes(start).replace(':', '')}00")
+                write_ical_line(file, f"DTEND:{first_day:%Y%m%d}T{format_minutes(end).replace(':', '')}00")
+                write_ical_line(file, f"RRULE:FREQ=WEEKLY;BYDAY={','.join(ICAL_DAYS[day] for day in days)};"
+                                      f"UNTIL={until}")
+                write_ical_line(file, f'SUMMARY:{ical_text(f"{course.name}-{course.section} {course.title}".strip())}')
+                write_ical_line(file, f'DESCRIPTION:{ical_text(f"CRN {course.crn}")}')
+                write_ical_line(file, 'END:VEVENT')
+        write_ical_line(file, 'END:VCALENDAR')
+    return num_schedules
+
+
+WRITERS = {
+    'ndjson': write_ndjson,
+    'json': write_compact_json,
+    'ics': write_ics,
+}
+
+
+def write_schedules(schedules, file, output_format='ndjson', **options):
+    """Stream any iterable of schedules, e.g. AGS.iter_schedules(), to a text file (or a socket's makefile('w'))
+    in one of WRITERS' formats, passing the writer any options, e.g. term_start for 'ics'. Schedules are written
+    one at a time and never collected, so memory stays flat however many there are."""
+    return WRITERS[output_format](schedules, file, **options)
+
+
+"""
+MAIN
+"""
+
+
+if __name__ == "__main__":
+    import io
+    import os
+    import tracemalloc
+
+    from catalog import load_catalog
+
+    catalog = load_catalog()
+    ags = AGS(catalog.get_sections('CSCI 205', 'CSCI 206', 'CSCI 206L', 'MATH 201'))
+    write_schedules(ags.iter_schedules(1), sys.stdout)
+    compact = io.StringIO()
+    print(f"{write_schedules(ags.iter_schedules(), compact, 'json')} schedules as compact JSON: "
+          f"{len(compact.getvalue())} characters")
+    write_schedules(ags.iter_schedules(1), sys.stdout, 'ics', term_start=datetime.date(2024, 8, 26),
+                    stamp=datetime.datetime(2024, 8, 1, tzinfo=datetime.timezone.utc))
+    large = AGS(catalog.get_sections('MATH 201', 'ECON 101')
+                + catalog.get_electives(1, 'PSYC 100', 'POLS 170', 'EDUC 102')
+                + catalog.get_electives(2, 'WMST 150', 'ENLS 101', 'PHIL 100')
+                + catalog.get_electives(3, 'POLS 140', 'CSCI 203'))
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        for limit in (1000, None):
+            tracemalloc.start()
+            num_written = write_schedules(large.iter_schedules(limit), devnull, 'json')
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{num_written} schedules streamed with a peak of {peak_memory / 1024:.1f} KiB")
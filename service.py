@@ -0,0 +1,238 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import SharedCatalog, request_key
+from catalog import load_catalog
+from main import SearchCancelled
+
+"""
+SCHEDULING SERVICE
+"""
+
+DEFAULT_TIMEOUT = 10.0  # seconds a request may take before it gets a timeout error
+PROBE_INTERVAL = 0.1  # seconds between the spaces written to a client that has sent EOF, see handle_connection()
+
+
+class InFlight:
+    """A search that is running for one request_key(), and how many requests are waiting on it."""
+
+    def __init__(self, future, cancel):
+        self.future = future  # resolves to the schedules as tuples of CRNs
+        self.cancel = cancel  # a threading.Event that stops the search (see AGS.cancel)
+        self.waiters = 0
+
+
+class SchedulingService:
+    """An asyncio front end to SharedCatalog.solve(), with searches run off the event loop by a pool of threads.
+
+    Concurrent requests with the same request_key() share one in-flight search instead of starting their own.
+    Each request waits at most its timeout, and once no request is waiting on a search any more (every one of
+    them timed out or was cancelled), the search is cancelled at its next recursion, so it stops using CPU.
+
+    The search is pure Python and holds the GIL, so however many workers there are, the searches share one core:
+    the threads keep the event loop responsive and let short requests finish alongside long ones, but they don't
+    add throughput. Requests that can be answered in batches use every core with batch.run_batch(), which
+    solves them in processes.
+
+    Attributes:
+    stats (dict) -- requests received, requests coalesced onto a search already running, searches started,
+    timeouts, and searches cancelled because nobody was waiting for them.
+    """
+
+    def __init__(self, path='course_data.json', workers=4, timeout=DEFAULT_TIMEOUT):
+        self.shared = SharedCatalog(load_catalog(path))  # read-only once built, so threads can share it
+        self.executor = ThreadPoolExecutor(workers)
+        self.timeout = timeout
+        self.in_flight = dict()  # request_key() → InFlight
+        self.stats = {'requests': 0, 'coalesced': 0, 'searches': 0, 'timeouts': 0, 'cancelled_searches': 0}
+
+    def close(self):
+        for search in self.in_flight.values():
+            search.cancel.set()
+        self.executor.shutdown(wait=True)
+
+    def start_search(self, key, request):
+        cancel = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self.shared.solve, request, cancel)
+        search = InFlight(future, cancel)
+
+        def finished(_):
+            if not future.cancelled():
+                future.exception()  # retrieved, so a cancelled search's SearchCancelled isn't logged as unhandled
+            if self.in_flight.get(key) is search:
+                del self.in_flight[key]
+
+        future.add_done_callback(finished)
+        self.in_flight[key] = search
+        self.stats['searches'] += 1
+        return search
+
+    async def schedule(self, request, timeout=None):
+        """Returns the schedules for a request (see SharedCatalog.get_courses()) as lists of CRNs, or raises
+        asyncio.TimeoutError if they take longer than timeout seconds (by default, self.timeout)."""
+        key = request_key(request)
+        self.stats['requests'] += 1
+        search = self.in_flight.get(key)
+        if search is None:
+            search = self.start_search(key, request)
+        else:
+            self.stats['coalesced'] += 1
+        search.waiters += 1
+        try:
+            schedules = await asyncio.wait_for(asyncio.shield(search.future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+        finally:
+            search.waiters -= 1
+            if not search.waiters and not search.future.done():
+                search.cancel.set()  # nobody is waiting any more, e.g. every request timed out
+                del self.in_flight[key]  # so the next identical request starts a new search
+                self.stats['cancelled_searches'] += 1
+        return [list(crns) for crns in schedules]
+
+    async def handle_connection(self, reader, writer):
+        """Answer each line of JSON read from a connection, e.g. {"courses": ["CSCI 205"], "limit": 10,
+        "timeout": 2}, with a line of JSON, e.g. {"schedules": [["50537"], ...]} or {"error": "timeout"}.
+        The requests of a connection are answered one at a time; use more connections to send more at once.
+
+        The connection keeps being read while a request is answered. A client that sends EOF (e.g. nc -N, or
+        write_eof()) may only have half-closed the connection, so its pending request is still answered, but no
+        more are read. Until the answer is ready, a space is written every PROBE_INTERVAL seconds, which JSON
+        ignores before the response: once the client is gone entirely, the write fails and the connection is
+        lost, so a search that only it was waiting on is cancelled (see schedule())."""
+        next_line = asyncio.ensure_future(reader.readline())
+        try:
+            while line := await next_line:
+                next_line = asyncio.ensure_future(reader.readline())  # the next request, or EOF if the client left
+                try:
+                    request = json.loads(line)
+                    answer = asyncio.ensure_future(self.schedule(request, request.get('timeout')))
+                    await asyncio.wait([answer, next_line], return_when=asyncio.FIRST_COMPLETED)
+                    while not answer.done() and next_line.done():  # the next request came, or EOF
+                        if next_line.exception() is None and next_line.result():
+                            break  # it is answered after this one
+                        if next_line.exception() is not None or writer.transport.is_closing():
+                            answer.cancel()  # the client went away, so nobody is waiting for this answer
+                            await asyncio.wait([answer])  # until schedule() has let go of the search
+                            return
+                        writer.write(b' ')  # fails once the client has closed its end too, not just half of it
+                        await asyncio.wait([answer], timeout=PROBE_INTERVAL)
+                    response = {'schedules': await answer}
+                except asyncio.TimeoutError:
+                    response = {'error': 'timeout'}
+                except (ValueError, AttributeError, TypeError) as error:  # e.g. not JSON, or not an object
+                    response = {'error': f'bad request: {error}'}
+                except SearchCancelled:  # the service is closing
+                    response = {'error': 'cancelled'}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass  # the client went away between requests
+        finally:
+            next_line.cancel()
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8205):
+        """Returns an asyncio.Server answering requests on host:port (port 0 picks a free port), by default
+        only reachable from this machine."""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def send_request(request, host='127.0.0.1', port=8205):
+    """Returns the service's response to a request, sent over a new connection."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+"""
+TESTS
+"""
+
+SLOW_REQUEST = {'courses': ['MATH 201', 'PHYS 211', 'PHYS 211L', 'CSCI 203', 'CSCI 203L', 'ECON 101', 'PHIL 100',
+                            'CHEM 205', 'CHEM 205L', 'CHEM 205R'],
+                'electives': [['PSYC 100', 'POLS 170', 'EDUC 102', 'WMST 150', 'ENLS 101']]}  # about 2 s of search
+
+
+async def test_half_close():
+    """A client that half-closes its connection after a request (e.g. nc -N) still gets the answer."""
+    print("▒" * 64)
+    print("Now testing: SchedulingService.handle_connection() with a client that half-closes...")
+    service = SchedulingService(timeout=20)
+    server = await service.serve(port=0)
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+    writer.write(json.dumps({'courses': ['CSCI 205', 'CSCI 206', 'MATH 201']}).encode('utf-8') + b'\n')
+    writer.write_eof()
+    response = json.loads(await reader.readline())
+    assert await reader.readline() == b'', 'the service kept the connection open after EOF'
+    writer.close()
+    await writer.wait_closed()
+    server.close()
+    await server.wait_closed()
+    service.close()
+    assert response.get('schedules'), response
+    assert service.stats['cancelled_searches'] == 0, service.stats
+    print(f"The half-closed connection got {len(response['schedules'])} schedules.")
+
+
+async def test_disconnect_cancels_search():
+    """A client that closes its connection mid-search gets its search cancelled, well before its deadline."""
+    print("▒" * 64)
+    print("Now testing: SchedulingService.handle_connection() with a client that disconnects...")
+    service = SchedulingService(timeout=20)
+    server = await service.serve(port=0)
+    port = server.sockets[0].getsockname()[1]
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(json.dumps(SLOW_REQUEST).encode('utf-8') + b'\n')
+    await writer.drain()
+    await asyncio.sleep(0.2)
+    writer.close()
+    await writer.wait_closed()
+    while service.in_flight and time.perf_counter() - start < 20:
+        await asyncio.sleep(0.01)
+    server.close()
+    await server.wait_closed()
+    service.close()  # waits for the worker thread, so this only returns once the search has stopped
+    seconds = time.perf_counter() - start
+    assert service.stats['cancelled_searches'] == 1, service.stats
+    assert seconds < 1, f'the search kept running for {seconds:.2f} s'
+    print(f"The search was cancelled {seconds:.2f} s after the request was sent.")
+
+
+"""
+MAIN
+"""
+
+
+async def demo():
+    service = SchedulingService(timeout=30)
+    server = await service.serve(port=0)
+    port = server.sockets[0].getsockname()[1]
+    request = {'courses': ['CSCI 205', 'CSCI 206', 'MATH 201'], 'electives': [['PSYC 100', 'POLS 170']]}
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(send_request(request, port=port) for _ in range(8)))
+    print(f"8 identical requests: {len(responses[0]['schedules'])} schedules each in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    large = {'courses': ['MATH 201', 'PHYS 211', 'PHYS 211L', 'CSCI 203', 'CSCI 203L', 'ECON 101', 'PHIL 100',
+                         'CHEM 205', 'CHEM 205L', 'CHEM 205R'], 'timeout': 0.05}
+    print(f"A large request with a 50 ms deadline: {await send_request(large, port=port)}")
+    server.close()
+    await server.wait_closed()
+    service.close()
+    print(service.stats)
+    await test_half_close()
+    await test_disconnect_cancels_search()
+
+
+if __name__ == "__main__":
+    asyncio.run(demo())